@@ -1,4 +1,5 @@
 from .api import IikoTransport
+from .async_api import AsyncIikoTransport
 from .models import *
 # import biz
 # import card
@@ -6,4 +7,3 @@ NAME = "pyiikocloudapi"
 __author__ = 'kebrick'
 __version__ = '0.0.1'
 __email__ = 'ruban.kebr@gmail.com'
-
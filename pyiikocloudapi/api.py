@@ -1,14 +1,55 @@
+import contextvars
 import datetime
-import json
+import functools
+import threading
 import uuid
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from datetime import datetime
+from time import perf_counter, sleep
+from typing import Callable, Dict, Iterator, Tuple
 import requests
 
-from pyiikocloudapi.decorators import experimental
-from pyiikocloudapi.exception import CheckTimeToken, SetSession, TokenException, PostException, ParamSetException
+from pyiikocloudapi.cache import ResponseCache, STALE
+from pyiikocloudapi.codec import get_codec
+from pyiikocloudapi.concurrency import CallResult, iter_parallel, run_parallel
+from pyiikocloudapi.exception import CheckTimeToken, SetSession, TokenException, PostException, ParamSetException, \
+    TransportException
+from pyiikocloudapi.hooks import Hooks, HookEvent, print_hook
+from pyiikocloudapi.metrics import Metrics
+from pyiikocloudapi.parsing import LazyModel, PARSE_BYTES, PARSE_FULL, PARSE_LAZY, check_parse_mode, \
+    current_parse_mode, parsing
+from pyiikocloudapi.ratelimit import RateLimiter
+from pyiikocloudapi.reference import ReferenceSnapshot
+from pyiikocloudapi.retry import RetryPolicy
+from pyiikocloudapi.sharding import Sharding
+from pyiikocloudapi.streaming import NomenclatureStreamParser, StreamParser, ijson
+from pyiikocloudapi import structs
+from pyiikocloudapi.token_store import TokenStore
+from pyiikocloudapi.transport import TransportConfig, pool_stats
 from pyiikocloudapi.models import *
 
+_token_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_token_locks_guard = threading.Lock()
+_NOT_PARSED = object()
+_NO_HOOKS = Hooks()
+DELIVERY_WINDOWS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+def _token_lock(base_url: str, api_login: str) -> threading.Lock:
+    """Блокировка обновления маркера доступа, одна на apiLogin в процессе"""
+    with _token_locks_guard:
+        lock = _token_locks.get((base_url, api_login))
+        if lock is None:
+            lock = _token_locks[(base_url, api_login)] = threading.Lock()
+        return lock
+
+
+def _call_parsing(mode: str, func):
+    with parsing(mode):
+        return func()
+
 
 class BaseAPI:
     DEFAULT_TIMEOUT = "00%3A02%3A00"
@@ -16,21 +57,44 @@ class BaseAPI:
     # __BASE_URL = "https://api-ru.iiko.services"
 
     def __init__(self, api_login: str, session: Optional[requests.Session] = None, debug: bool = False,
-                 base_url: str = None, working_token: str = None, base_headers: dict = None):
+                 base_url: str = None, working_token: str = None, base_headers: dict = None, codec=None,
+                 metrics: Union[bool, Metrics] = False, retry_policy: Union[bool, RetryPolicy] = True,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 token_refresh_interval: Optional[timedelta] = timedelta(minutes=45),
+                 token_store: Optional[TokenStore] = None, lazy: bool = False,
+                 transport: Optional[TransportConfig] = None, parse_mode: str = PARSE_FULL,
+                 model_backend: str = "pydantic", cache: Union[bool, ResponseCache] = False,
+                 sharding: Union[bool, Sharding] = False):
         """
 
         :param api_login: login api iiko cloud
         :param session: session object
-        :param debug: print dict reponse
+        :param debug: print request and response (subscribes print_hook to api.hooks)
         :param base_url: url iiko cloud api
         :param working_token: Initialize an object based on a working token, that is, without requesting a new one
         :param base_headers: base header for request in iiko cloud api
+        :param codec: JSON codec: "orjson", "msgspec", "json" or object with dumps/loads, by default the fastest installed
+        :param metrics: True or Metrics object (can be shared between clients) to collect per-endpoint metrics
+        :param retry_policy: RetryPolicy for transient errors (408, 429, 5xx, connection errors), True - default policy,
+        False - no retries. Only idempotent requests are retried
+        :param rate_limiter: client-side limiter, see RateLimiter.for_login
+        :param token_refresh_interval: token age after which it is refreshed before the next request
+        (token lifetime is ~60 minutes), None - refresh only on 401
+        :param token_store: shared token storage (MemoryTokenStore, FileTokenStore, SQLiteTokenStore), a still valid
+        token from the store is reused instead of requesting a new one
+        :param lazy: do not request a token in the constructor, it is requested on the first request or by warmup()
+        :param transport: connection pool and timeouts settings, the pool settings are applied to the session created
+        by the client or, if transport is passed explicitly, to the passed session
+        :param parse_mode: response parsing: "full" - validated models, "lazy" - LazyModel (fields are validated on
+        access), "raw" - dict, "bytes" - response body. For a single call use `with api.parsing(mode):`
+        :param model_backend: "pydantic" or "msgspec" - successful responses are decoded straight into msgspec.Struct
+        built from the same models (same field names and methods, several times faster), errors stay CustomErrorModel
+        :param cache: True or ResponseCache (can be shared between clients) - TTL/LRU cache of Dictionaries responses
+        :param sharding: True or Sharding - split long organizationIds lists into parallel requests and merge responses
         """
 
-        if session is not None:
-            self.__session = session
-        else:
-            self.__session = requests.Session()
+        self.__transport = transport if transport is not None else TransportConfig()
+        self.__session = self._create_session(session, transport)
 
         self.__api_login = api_login
         self.__token: Optional[str] = None
@@ -39,17 +103,48 @@ class BaseAPI:
         self.__organizations_ids_model: Optional[BaseOrganizationsModel] = None
         self.__organizations_ids: Optional[List[str]] = None
         self.__strfdt = "%Y-%m-%d %H:%M:%S.000"
+        self.__codec = get_codec(codec)
+        self.__hooks = Hooks()
+        if debug:
+            self.__hooks.on_response(print_hook)
+            self.__hooks.on_error(print_hook)
+        self.__metrics: Optional[Metrics] = Metrics() if metrics is True else (metrics or None)
+        if self.__metrics is not None:
+            self.__metrics.attach(self.__hooks)
+        self.__retry_policy: Optional[RetryPolicy] = RetryPolicy() if retry_policy is True else (retry_policy or None)
+        self.__rate_limiter = rate_limiter
+        self.__token_refresh_interval = token_refresh_interval
+        self.__token_store = token_store
+        self.__parse_mode = check_parse_mode(parse_mode)
+        self.__model_backend = structs.check_model_backend(model_backend)
+        self.__cache: Optional[ResponseCache] = ResponseCache() if cache is True else \
+            (None if cache is False else cache)
+        self.__sharding: Optional[Sharding] = Sharding() if sharding is True else (sharding or None)
+        self.__refresher: Optional[threading.Thread] = None
+        self.__refresher_stop = threading.Event()
 
         self.__base_url = "https://api-ru.iiko.services" if base_url is None else base_url
         self.__headers = {
             "Content-Type": "application/json",
         } if base_headers is None else base_headers
-        self.__set_token(working_token) if working_token is not None else self.__get_access_token()
+        if working_token is not None:
+            self._set_token(working_token)
+        elif not lazy:
+            self._init_access_token()
         # if working_token is not None:
         #     self.__set_token(working_token)
         # else:
         #     self.__get_access_token()
 
+    def _create_session(self, session: Optional[requests.Session],
+                        transport: Optional[TransportConfig]) -> Optional[requests.Session]:
+        """Сессия requests с настройками пула из transport (асинхронный клиент её не создаёт)"""
+        if session is not None:
+            if transport is not None:
+                transport.mount(session)
+            return session
+        return self.__transport.mount(requests.Session())
+
     def check_status_code_token(self, code: Union[str, int]):
         if str(code) == "401":
             self.__get_access_token()
@@ -134,6 +229,92 @@ class BaseAPI:
     def strfdt(self, value: str):
         self.__strfdt = value
 
+    @property
+    def codec(self):
+        return self.__codec
+
+    @property
+    def hooks(self) -> Hooks:
+        """Подписки на события запросов: on_request, on_response, on_error"""
+        return self.__hooks
+
+    @property
+    def retry_policy(self) -> Optional[RetryPolicy]:
+        return self.__retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, value: Optional[RetryPolicy]):
+        self.__retry_policy = value
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return self.__rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, value: Optional[RateLimiter]):
+        self.__rate_limiter = value
+
+    @property
+    def token_refresh_interval(self) -> Optional[timedelta]:
+        return self.__token_refresh_interval
+
+    @token_refresh_interval.setter
+    def token_refresh_interval(self, value: Optional[timedelta]):
+        self.__token_refresh_interval = value
+
+    @property
+    def token_store(self) -> Optional[TokenStore]:
+        return self.__token_store
+
+    @property
+    def transport(self) -> TransportConfig:
+        return self.__transport
+
+    @property
+    def parse_mode(self) -> str:
+        return self.__parse_mode
+
+    @parse_mode.setter
+    def parse_mode(self, value: str):
+        self.__parse_mode = check_parse_mode(value)
+
+    @staticmethod
+    def parsing(mode: str):
+        """Режим разбора ответов для вызовов внутри блока with (full, lazy, raw, bytes)"""
+        return parsing(mode)
+
+    def _current_parse_mode(self) -> str:
+        return current_parse_mode(self.__parse_mode)
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        return self.__cache
+
+    @property
+    def sharding(self) -> Optional[Sharding]:
+        return self.__sharding
+
+    @sharding.setter
+    def sharding(self, value: Optional[Sharding]):
+        self.__sharding = value
+
+    @property
+    def model_backend(self) -> str:
+        return self.__model_backend
+
+    @model_backend.setter
+    def model_backend(self, value: str):
+        self.__model_backend = structs.check_model_backend(value)
+
+    def pool_stats(self) -> Dict[str, dict]:
+        """Состояние пула соединений: in_use, idle, connections, requests, reuse_ratio по хостам"""
+        return pool_stats(self.__session)
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        """Метрики запросов, если включены параметром metrics"""
+        return self.__metrics
+
     @property
     def headers(self):
         return self.__headers
@@ -142,56 +323,469 @@ class BaseAPI:
     def headers(self, value: str):
         self.__headers = value
 
-    def __set_token(self, token):
+    def _set_token(self, token, time_token: Optional[datetime] = None):
+        # Новый словарь заголовков, а не изменение общего: запросы в других потоках видят либо старый,
+        # либо новый маркер целиком
+        headers = dict(self.__headers)
+        headers["Authorization"] = f"Bearer {token}"
+        self.__time_token = datetime.now() if time_token is None else time_token
         self.__token = token
-        self.__headers["Authorization"] = f"Bearer {self.token}"
-        self.__time_token = datetime.now()
+        self.__headers = headers
+
+    def _token_fresh(self, time_token: Optional[datetime]) -> bool:
+        """Маркер, полученный в time_token, ещё не нужно обновлять"""
+        if time_token is None:
+            return False
+        interval = self.__token_refresh_interval
+        return interval is None or datetime.now() - time_token < interval
+
+    def _token_expired(self) -> bool:
+        """Маркера нет или пора обновить его по token_refresh_interval"""
+        return self.__token is None or not self._token_fresh(self.__time_token)
+
+    def _token_from_store(self, stale_token: Optional[str]) -> bool:
+        """Взять из token_store маркер, полученный другим клиентом, если он свежий"""
+        cached = self.__token_store.get(self.__api_login, self.__base_url)
+        if cached is not None and cached[0] != stale_token and self._token_fresh(cached[1]):
+            self._set_token(*cached)
+            return True
+        return False
+
+    def _token_to_store(self):
+        self.__token_store.set(self.__api_login, self.__base_url, self.__token, self.__time_token)
+
+    def _refresh_token(self, stale_token: Optional[str]):
+        """
+        Обновить маркер доступа. Одновременно выполняется только одно обновление на apiLogin: остальные потоки
+        дожидаются его и используют уже полученный маркер.
+        :param stale_token: маркер, с которым был сделан запрос (None - маркера не было)
+        """
+        with _token_lock(self.__base_url, self.__api_login):
+            if self.__token is not None and self.__token != stale_token:
+                return
+            if self.__token_store is None:
+                self.__get_access_token()
+                return
+            with self.__token_store.lock(self.__api_login, self.__base_url):
+                if self._token_from_store(stale_token):
+                    return
+                self.__get_access_token()
+                self._token_to_store()
+
+    def _ensure_token(self):
+        if self._token_expired():
+            self._refresh_token(self.__token)
+
+    def __open_connection(self):
+        try:
+            self.session_s.head(self.__base_url, timeout=self.__transport.timeout())
+        except requests.exceptions.RequestException:
+            pass
+
+    def warmup(self, connections: int = 4, organizations: bool = True):
+        """
+        Подготовить клиент к работе: запросить маркер доступа и одновременно открыть TLS соединения в пуле,
+        затем запросить организации (api.organizations_ids)
+        :param connections: number of connections to open in parallel with the token request
+        :param organizations: request organizations
+        :return: result of organizations() or None
+        """
+        with ThreadPoolExecutor(max_workers=connections + 1) as executor:
+            futures = [executor.submit(self._ensure_token)]
+            futures += [executor.submit(self.__open_connection) for _ in range(connections)]
+            for future in futures:
+                future.result()
+        if organizations:
+            return self.organizations()
+
+    def start_token_refresher(self, check_interval: float = 60.0):
+        """
+        Запустить фоновое обновление маркера доступа (daemon поток), чтобы запросы не ждали обновления
+        :param check_interval: how often to check the token age, seconds
+        """
+        if self.__refresher is not None and self.__refresher.is_alive():
+            return
+        self.__refresher_stop.clear()
+
+        def run():
+            while not self.__refresher_stop.wait(check_interval):
+                try:
+                    self._ensure_token()
+                except Exception as err:
+                    warnings.warn(f"Не удалось обновить маркер доступа: {err!r}", RuntimeWarning)
+
+        self.__refresher = threading.Thread(target=run, name=f"iiko-token-{self.__api_login[:8]}", daemon=True)
+        self.__refresher.start()
+
+    def stop_token_refresher(self):
+        """Остановить фоновое обновление маркера доступа"""
+        self.__refresher_stop.set()
+        if self.__refresher is not None:
+            self.__refresher.join()
+            self.__refresher = None
 
     def access_token(self):
         """Получить маркер доступа"""
-        data = json.dumps({"apiLogin": self.api_login})
+        data = self.__codec.dumps({"apiLogin": self.api_login})
         try:
-            result = self.session_s.post(f'{self.__base_url}/api/1/access_token', json=data)
+            result = self.session_s.post(f'{self.__base_url}/api/1/access_token', data=data,
+                                         headers={"Content-Type": "application/json"},
+                                         timeout=self.__transport.timeout("/api/1/access_token"))
 
-            response_data: dict = json.loads(result.content)
+            response_data: dict = self.__codec.loads(result.content)
             if response_data.get("errorDescription", None) is not None:
                 raise TypeError(f'{response_data=}')
 
             if response_data.get("token", None) is not None:
                 self.check_status_code_token(result.status_code)
-                self.__set_token(response_data.get("token", ""))
+                self._set_token(response_data.get("token", ""))
 
         except requests.exceptions.RequestException as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.access_token.__name__,
                                  f"Не удалось получить маркер доступа: \n{err}")
-        except TypeError as err:
+        except (TypeError, ValueError) as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.access_token.__name__,
                                  f"Не удалось получить маркер доступа: \n{err}")
 
-    def _post_request(self, url: str, data: dict = None, model_response_data=None, model_error=CustomErrorModel):
+    def _post_request(self, url: str, data: dict = None, model_response_data=None, model_error=CustomErrorModel,
+                      idempotent: bool = True):
+        """
+        POST запрос к iiko Cloud API, ответы справочников отдаются из кэша (если он включён)
+        :param idempotent: the request can be safely repeated, only such requests are retried by retry_policy
+        """
+        key, value, found = self._cache_lookup(url, data, model_response_data, model_error)
+        if found:
+            return value
+        out = self._fetch(url, data, model_response_data, model_error, idempotent)
+        return out if key is None else self._cache_result(key, out)
+
+    def _cache_lookup(self, url: str, data: Optional[dict], model_response_data, model_error):
+        """
+        Ответ из кэша, общий для обоих клиентов: (key, value, found), key=None - url не кэшируется.
+        Ключ учитывает режим разбора и model_backend. Для устаревшего ответа запускается фоновое обновление
+        """
+        cache = self.__cache
+        if cache is None or not cache.cacheable(url):
+            return None, None, False
+        key = cache.key(url, data, self._current_parse_mode(), self.__model_backend)
+        value, state = cache.get(key)
+        if state == STALE and cache.begin_refresh(key):
+            self._start_refresh(key, url, data, model_response_data, model_error)
+        return key, value, state is not None
+
+    def _cache_result(self, key, out):
+        """Сохранить успешный ответ в кэш"""
+        if not isinstance(out, CustomErrorModel):
+            self.__cache.set(key, out)
+        return out
+
+    def _start_refresh(self, key, url: str, data: dict, model_response_data, model_error):
+        # Режим разбора хранится в contextvars, поэтому поток обновления выполняется в копии контекста
+        threading.Thread(target=contextvars.copy_context().run,
+                         args=(self._refresh_cached, key, url, data, model_response_data, model_error),
+                         daemon=True).start()
+
+    def _refresh_cached(self, key, url: str, data: dict, model_response_data, model_error):
+        """Фоновое обновление устаревшего ответа в кэше"""
+        try:
+            self._cache_result(key, self._fetch(url, data, model_response_data, model_error))
+        except Exception as err:
+            warnings.warn(f"Не удалось обновить кэш {url}: {err!r}", RuntimeWarning)
+        finally:
+            self.__cache.end_refresh(key)
+
+    def _fetch(self, url: str, data: dict = None, model_response_data=None, model_error=CustomErrorModel,
+               idempotent: bool = True):
+        """Запрос, длинный organizationIds которого разбивается на параллельные части (если включён sharding)"""
+        sharding = self.__sharding
+        if sharding is None or not sharding.applies(url, data):
+            return self._send_request(url, data, model_response_data, model_error, idempotent)
+
+        mode = self._current_parse_mode()
+        calls = [(index, functools.partial(self._send_request, url, chunk, None, model_error, idempotent))
+                 for index, chunk in enumerate(sharding.split(data))]
+        start = perf_counter()
+
+        def build(results: Dict[int, CallResult]):
+            responses = []
+            for index in sorted(results):
+                result = results[index]
+                if isinstance(result.error, Exception):
+                    raise result.error
+                if result.error is not None:
+                    return result.error
+                responses.append(result.value)
+            merged = Sharding.merge(responses)
+            with parsing(mode):
+                return self._parse_merged(url, data, merged, perf_counter() - start, model_response_data,
+                                          model_error)
+
+        return self._run_parallel(calls, build, sharding.max_workers)
+
+    def _parse_merged(self, url: str, data: dict, merged: dict, elapsed: float, model_response_data,
+                      model_error=CustomErrorModel):
+        """
+        Разбор объединённого ответа частей так же, как ответа одного запроса. Хуки (и метрики) уже получили
+        события каждой части, поэтому для объединённого ответа они не вызываются
+        """
+        body = self.__codec.dumps(data)
+        content = self.__codec.dumps(merged)
+        out = self._parse_direct(url, body, 200, content, elapsed, model_response_data, emit_hooks=False)
+        if out is not _NOT_PARSED:
+            return out
+        return self._parse_response(url, body, 200, content, merged, elapsed, model_response_data, model_error,
+                                    emit_hooks=False)
+
+    def _transport_error(self, url: str, err: Exception) -> TransportException:
+        """Ошибка HTTP клиента (requests или httpx) - одно исключение для обоих клиентов и всех методов"""
+        return TransportException(self.__class__.__qualname__, url, f"Ошибка запроса: \n{err}")
+
+    def _send_with_retry(self, url: str, body: bytes, idempotent: bool = True, stream: bool = False):
+        """
+        Отправка запроса: ограничитель частоты, хуки, повторы по retry_policy и обновление маркера по 401.
+        Общая для обычных и потоковых (stream=True) запросов
+        :return: (response, start) - ответ последней попытки и время её начала
+        """
+        hooks = self.__hooks
+        policy = self.__retry_policy if idempotent else None
+        if policy is not None:
+            policy.budget.deposit()
+
+        limiter = self.__rate_limiter
+        first_start = perf_counter()
+        attempt = 0
+        token_refreshed = False
+        self._ensure_token()
+        while True:
+            if limiter is not None:
+                limiter.acquire(url)
+            if hooks.request:
+                hooks.emit(hooks.request, HookEvent(url, body))
+            token = self.__token
+            start = perf_counter()
+            try:
+                result = self.session_s.post(f'{self.base_url}{url}', data=body, headers=self.__headers,
+                                             timeout=self.__transport.timeout(url), stream=stream)
+            except Exception as err:
+                if hooks.error:
+                    hooks.emit(hooks.error, HookEvent(url, body, elapsed=perf_counter() - start, error=err))
+                if policy is not None and isinstance(err, (requests.exceptions.ConnectionError,
+                                                           requests.exceptions.Timeout)):
+                    delay = policy.next_delay(attempt, perf_counter() - first_start)
+                    if delay is not None:
+                        sleep(delay)
+                        attempt += 1
+                        continue
+                if isinstance(err, requests.exceptions.RequestException):
+                    raise self._transport_error(url, err) from err
+                raise
+
+            if result.status_code == 401 and not token_refreshed:
+                # Маркер истёк раньше времени: один раз обновляем и повторяем запрос
+                if hooks.error:
+                    hooks.emit(hooks.error, HookEvent(url, body, result.status_code,
+                                                      None if stream else result.content, perf_counter() - start))
+                result.close()
+                self._refresh_token(token)
+                token_refreshed = True
+                continue
+
+            if policy is not None and policy.is_retryable_status(result.status_code):
+                delay = policy.next_delay(attempt, perf_counter() - first_start)
+                if delay is not None:
+                    if hooks.error:
+                        hooks.emit(hooks.error, HookEvent(url, body, result.status_code,
+                                                          None if stream else result.content,
+                                                          perf_counter() - start))
+                    result.close()
+                    sleep(delay)
+                    attempt += 1
+                    continue
+            return result, start
+
+    def _send_request(self, url: str, data: dict = None, model_response_data=None, model_error=CustomErrorModel,
+                      idempotent: bool = True):
+        """POST запрос к iiko Cloud API"""
         if data is None:
             data = {}
 
-        print(json.dumps(data))
-        result = self.session_s.post(f'{self.base_url}{url}', json=json.dumps(data),
-                                     headers=self.headers)
-
-        response_data: dict = json.loads(result.content)
+        body = self.__codec.dumps(data)
+        result, start = self._send_with_retry(url, body, idempotent)
 
-        print(json.dumps(response_data))
+        out = self._parse_direct(url, body, result.status_code, result.content, perf_counter() - start,
+                                 model_response_data)
+        if out is not _NOT_PARSED:
+            return out
 
-        if self.__debug:
-            print(f"{result.status_code=}\n{response_data=}\n")
+        response_data = self._loads_response(url, body, result.status_code, result.content, start)
+        return self._parse_response(url, body, result.status_code, result.content, response_data,
+                                    perf_counter() - start, model_response_data, model_error)
 
+    def _loads_response(self, url: str, body: bytes, status_code: int, content: bytes, start: float) -> dict:
+        """Разбор тела ответа, не JSON (например, HTML от прокси) - событие hooks.error и ValueError"""
+        try:
+            return self.__codec.loads(content)
+        except ValueError as err:
+            hooks = self.__hooks
+            if hooks.error:
+                hooks.emit(hooks.error, HookEvent(url, body, status_code, content, perf_counter() - start,
+                                                  error=err))
+            raise
+
+    def _post_stream(self, url: str, data: dict, parser: StreamParser, model_error=CustomErrorModel):
+        """
+        POST запрос к iiko Cloud API с потоковым разбором ответа: генератор (kind, value) от parser,
+        ответ с ошибкой отдаётся как ("error", model_error), тело ответа не JSON - ValueError, как в _send_request
+        """
+        body = self.__codec.dumps(data)
+        hooks = self.__hooks
+        result, start = self._send_with_retry(url, body, stream=True)
+
+        with result:
+            if result.status_code != 200:
+                # Ответы с ошибкой небольшие: разбираем целиком
+                response_data = self._loads_response(url, body, result.status_code, result.content, start)
+                out = self._parse_response(url, body, result.status_code, result.content, response_data,
+                                           perf_counter() - start, None, model_error)
+                if isinstance(out, dict):
+                    out = model_error.parse_obj(out)
+                    out.status_code = result.status_code
+                yield "error", out
+                return
+
+            result.raw.decode_content = True
+            for prefix, event, value in ijson.parse(result.raw, use_float=True):
+                item = parser.event(prefix, event, value)
+                if item is not None:
+                    yield item
+            values = parser.finish()
+            if hooks.response:
+                hooks.emit(hooks.response, HookEvent(url, body, result.status_code, None, perf_counter() - start,
+                                                     dict(values).get("correlation_id")))
+            yield from values
+
+    def _parse_direct(self, url: str, body: bytes, status_code: int, content: bytes, elapsed: float,
+                      model_response_data=None, emit_hooks: bool = True):
+        """
+        Успешный ответ без промежуточного dict: тело ответа в режиме "bytes" или Struct при model_backend="msgspec".
+        Возвращает _NOT_PARSED, если ответ нужно разбирать обычным путём (codec.loads + _parse_response)
+        """
+        if status_code != 200 or model_response_data is None:
+            return _NOT_PARSED
+        mode = self._current_parse_mode()
+        hooks = self.__hooks if emit_hooks else _NO_HOOKS
+        if mode == PARSE_BYTES:
+            if hooks.response:
+                hooks.emit(hooks.response, HookEvent(url, body, status_code, content, elapsed))
+            return content
+        if mode != PARSE_FULL or self.__model_backend != "msgspec":
+            return _NOT_PARSED
+
+        parse_start = perf_counter()
+        try:
+            out = structs.decode(model_response_data, content)
+        except structs.msgspec.DecodeError as err:
+            # Ответ не совпал со схемой строго: разбираем моделью pydantic, которая приводит типы мягче
+            warnings.warn(f"msgspec не разобрал ответ {url} в {model_response_data.__name__}: {err}", RuntimeWarning)
+            return _NOT_PARSED
+        if hooks.response:
+            hooks.emit(hooks.response, HookEvent(url, body, status_code, content, elapsed,
+                                                 getattr(out, "correlation_id", None),
+                                                 parse_elapsed=perf_counter() - parse_start))
+        return out
+
+    def _parse_response(self, url: str, body: bytes, status_code: int, content: bytes, response_data: dict,
+                        elapsed: float, model_response_data=None, model_error=CustomErrorModel,
+                        emit_hooks: bool = True):
+        """Разбор ответа iiko в модель, общий для синхронного и асинхронного клиента"""
+        hooks = self.__hooks if emit_hooks else _NO_HOOKS
         if response_data.get("errorDescription", None) is not None:
+            if hooks.error:
+                hooks.emit(hooks.error, HookEvent(url, body, status_code, content, elapsed,
+                                                  response_data.get("correlationId")))
             error_model = model_error.parse_obj(response_data)
-            error_model.status_code = result.status_code
+            error_model.status_code = status_code
             return error_model
-        if model_response_data is not None:
-            return model_response_data.parse_obj(response_data)
-        return response_data
+
+        mode = self._current_parse_mode() if model_response_data is not None else None
+        if mode is None or mode not in (PARSE_FULL, PARSE_LAZY):
+            out, parse_elapsed = response_data, 0.0
+        else:
+            parse_start = perf_counter()
+            try:
+                if mode == PARSE_LAZY:
+                    out = LazyModel(model_response_data, response_data)
+                else:
+                    out = model_response_data.parse_obj(response_data)
+            except Exception as err:
+                if hooks.error:
+                    hooks.emit(hooks.error, HookEvent(url, body, status_code, content, elapsed,
+                                                      response_data.get("correlationId"), err,
+                                                      perf_counter() - parse_start))
+                raise
+            parse_elapsed = perf_counter() - parse_start
+
+        if hooks.response:
+            hooks.emit(hooks.response, HookEvent(url, body, status_code, content, elapsed,
+                                                 response_data.get("correlationId"), parse_elapsed=parse_elapsed))
+        return out
+
+    def _run_parallel(self, calls, build, max_workers: int = 8, timeout: float = None, parse_mode: str = None):
+        """
+        Выполнить вызовы (key, func) параллельно в пуле потоков и вернуть build(результаты по ключам).
+        Асинхронный клиент выполняет их в event loop, поэтому методы, построенные на _run_parallel,
+        работают с обоими клиентами
+        :param parse_mode: parse mode for the calls (for example "full", when build needs models)
+        """
+        if parse_mode is not None:
+            calls = [(key, functools.partial(_call_parsing, parse_mode, func)) for key, func in calls]
+        return build(run_parallel(calls, max_workers, timeout))
+
+    def _stream_parallel(self, calls, emit, max_workers: int = 8, timeout: float = None, parse_mode: str = None):
+        """
+        Выполнить вызовы (key, func) параллельно и отдавать элементы emit(CallResult) по мере завершения вызовов.
+        Для асинхронного клиента - асинхронный итератор
+        :param emit: function CallResult -> iterable of items
+        :param parse_mode: parse mode for the calls
+        """
+        if parse_mode is not None:
+            calls = ((key, functools.partial(_call_parsing, parse_mode, func)) for key, func in calls)
+        for result in iter_parallel(calls, max_workers, timeout):
+            yield from emit(result)
+
+    def _fan_out_calls(self, method: Union[str, Callable], organization_ids: List[str], args: tuple, kwargs: dict):
+        if isinstance(method, str):
+            method = getattr(self, method)
+        return [(organization_id, functools.partial(method, organization_id, *args, **kwargs))
+                for organization_id in organization_ids]
+
+    def fan_out(self, method: Union[str, Callable], organization_ids: List[str], *args, max_workers: int = 8,
+                timeout: float = None, ordered: bool = False, **kwargs) -> Iterator[CallResult]:
+        """
+        Вызвать метод для каждой организации параллельно (для методов с одним organization_id: nomenclature, by_city ...)
+
+            for result in api.fan_out(api.nomenclature, api.organizations_ids, max_workers=16, timeout=60):
+                if result.ok:
+                    save(result.organization_id, result.value)
+
+        Ошибки отдельных организаций не прерывают остальные: исключение, TimeoutError или CustomErrorModel
+        попадают в result.error. Для AsyncIikoTransport - асинхронный итератор (async for).
+        :param method: bound method or its name, organization_id is passed as the first argument
+        :param organization_ids: Organizations IDs
+        :param args: other positional arguments of the method
+        :param max_workers: maximum number of simultaneous requests
+        :param timeout: timeout of one call, seconds
+        :param ordered: results in order of organization_ids instead of completion order
+        :param kwargs: other keyword arguments of the method
+        """
+        return iter_parallel(self._fan_out_calls(method, organization_ids, args, kwargs), max_workers, timeout,
+                             ordered)
+
+    def _init_access_token(self):
+        """Получение маркера доступа при создании объекта"""
+        self._refresh_token(None)
 
     def __get_access_token(self):
         out = self.access_token()
@@ -200,8 +794,12 @@ class BaseAPI:
                                  self.access_token.__name__,
                                  f"Не удалось получить маркер доступа: \n{out}")
 
-    def __convert_org_data(self, data: BaseOrganizationsModel):
-        self.__organizations_ids = data.__list_id__()
+    def _convert_org_data(self, data: BaseOrganizationsModel):
+        # data может быть моделью, LazyModel, Struct или dict (parse_mode="raw")
+        if isinstance(data, dict):
+            self.__organizations_ids = [org["id"] for org in data.get("organizations") or ()]
+        else:
+            self.__organizations_ids = [org.id for org in data.organizations]
 
     def organizations(self, organization_ids: List[str] = None, return_additional_info: bool = None,
                       include_disabled: bool = None) -> Union[CustomErrorModel, BaseOrganizationsModel]:
@@ -226,15 +824,11 @@ class BaseAPI:
                 data=data,
                 model_response_data=BaseOrganizationsModel
             )
-            if isinstance(response_data, BaseOrganizationsModel):
-                self.__convert_org_data(data=response_data)
+            if hasattr(response_data, "organizations") or isinstance(response_data, dict):
+                self._convert_org_data(data=response_data)
 
             return response_data
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.organizations.__name__,
-                                 f"Не удалось получить организации: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.organizations.__name__,
@@ -257,10 +851,6 @@ class Dictionaries(BaseAPI):
                 data=data,
                 model_response_data=BaseCancelCausesModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.cancel_causes.__name__,
-                                 f"Не удалось получить причины отмены доставки: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.cancel_causes.__name__,
@@ -281,10 +871,6 @@ class Dictionaries(BaseAPI):
                 data=data,
                 model_response_data=BaseOrderTypesModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.order_types.__name__,
-                                 f"Не удалось получить типы заказа: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.order_types.__name__,
@@ -305,10 +891,6 @@ class Dictionaries(BaseAPI):
                 data=data,
                 model_response_data=BaseDiscountsModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.discounts.__name__,
-                                 f"Не удалось получить скидки/надбавки: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.discounts.__name__,
@@ -329,10 +911,6 @@ class Dictionaries(BaseAPI):
                 data=data,
                 model_response_data=BasePaymentTypesModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.payment_types.__name__,
-                                 f"Не удалось получить типы оплаты: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.payment_types.__name__,
@@ -353,10 +931,6 @@ class Dictionaries(BaseAPI):
                 data=data,
                 model_response_data=BaseRemovalTypesModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.removal_types.__name__,
-                                 f"Не удалось получить removal_types: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.removal_types.__name__,
@@ -369,10 +943,6 @@ class Dictionaries(BaseAPI):
                 url="/api/1/tips_types",
                 model_response_data=BaseTipsTypesModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.removal_types.__name__,
-                                 f"Не удалось получить подсказки для группы api-logins rms: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.removal_types.__name__,
@@ -395,15 +965,36 @@ class Menu(BaseAPI):
                 data=data,
                 model_response_data=BaseNomenclatureModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.nomenclature.__name__,
-                                 f"Не удалось получить номенклатуру: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.nomenclature.__name__,
                             f"Не удалось получить номенклатуру: \n{err}")
 
+    def nomenclature_stream(self, organization_id: str, start_revision: int = None):
+        """
+        Номенклатура с потоковым разбором ответа (требуется ijson): элементы отдаются по одному, не дожидаясь
+        загрузки всего ответа, поэтому в памяти не держится ни тело ответа, ни BaseNomenclatureModel целиком.
+
+            for kind, item in api.nomenclature_stream(organization_id):
+                if kind == "products":
+                    ...
+                elif kind == "revision":
+                    revision = item
+
+        kind: "groups", "product_categories", "products", "sizes", в конце "correlation_id" и "revision",
+        при ошибке iiko - "error" с CustomErrorModel.
+        Для асинхронного клиента - асинхронный генератор (async for).
+        :param organization_id: Organization ID.
+        :param start_revision: Initial revision. Items list will be received only in case there is a newer revision in the database.
+        """
+        data = {
+            "organizationId": organization_id,
+        }
+        if start_revision is not None:
+            data["startRevision"] = start_revision
+
+        return self._post_stream(url="/api/1/nomenclature", data=data, parser=NomenclatureStreamParser())
+
     def menu(self, ) -> Union[CustomErrorModel, BaseMenuModel]:
         try:
 
@@ -411,10 +1002,6 @@ class Menu(BaseAPI):
                 url="/api/2/menu",
                 model_response_data=BaseMenuModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.nomenclature.__name__,
-                                 f"Не удалось получить внешние меню с ценовыми категориями: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.nomenclature.__name__,
@@ -438,10 +1025,6 @@ class Menu(BaseAPI):
                 data=data,
                 model_response_data=BaseMenuByIdModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.nomenclature.__name__,
-                                 f"Не удалось получить внешнее меню по ID.: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.nomenclature.__name__,
@@ -473,10 +1056,6 @@ class TerminalGroup(BaseAPI):
                 data=data,
                 model_response_data=BaseTerminalGroupsModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.terminal_groups.__name__,
-                                 f"Не удалось получить регионы: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.terminal_groups.__name__,
@@ -506,10 +1085,6 @@ class TerminalGroup(BaseAPI):
                 data=data,
                 model_response_data=BaseTGIsAliveyModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.is_alive.__name__,
-                                 f"Не удалось получить регионы: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.is_alive.__name__,
@@ -538,10 +1113,6 @@ class Address(BaseAPI):
                 data=data,
                 model_response_data=BaseRegionsModel
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.regions.__name__,
-                                 f"Не удалось получить регионы: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.regions.__name__,
@@ -570,10 +1141,6 @@ class Address(BaseAPI):
             )
 
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.cities.__name__,
-                                 f"Не удалось получить города: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.cities.__name__,
@@ -599,10 +1166,6 @@ class Address(BaseAPI):
             )
 
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.cities.__name__,
-                                 f"Не удалось получить улицы: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.cities.__name__,
@@ -617,13 +1180,9 @@ class Orders(BaseAPI):
             return self._post_request(
                 url="/api/1/order/create",
                 data=order.dict(),
-                model_response_data=BaseCreatedOrderInfoModel
-
+                model_response_data=BaseCreatedOrderInfoModel,
+                idempotent=order.order.id is not None,
             )
-        except requests.exceptions.RequestException as err:
-            raise PostException(self.__class__.__qualname__,
-                                self.order_create.__name__,
-                                f"Не удалось создать заказ из за: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.order_create.__name__,
@@ -640,10 +1199,6 @@ class Orders(BaseAPI):
                 model_response_data=OrderResponseModel
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.get_orders_by_ids.__name__,
-                                 f"Не удалось получить заказы: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.get_orders_by_ids.__name__,
@@ -660,10 +1215,6 @@ class Orders(BaseAPI):
                 model_response_data=OrderResponseModel
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.get_orders_by_tables.__name__,
-                                 f"Не удалось получить заказы: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.get_orders_by_tables.__name__,
@@ -677,13 +1228,10 @@ class Orders(BaseAPI):
             return self._post_request(
                 url="/api/1/order/close",
                 data=data.dict(),
-                model_response_data=BaseResponseModel
+                model_response_data=BaseResponseModel,
+                idempotent=False,
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.close_order.__name__,
-                                 f"Не удалось получить заказы: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.close_order.__name__,
@@ -697,13 +1245,10 @@ class Orders(BaseAPI):
             return self._post_request(
                 url="/api/1/order/add_items",
                 data=data.dict(),
-                model_response_data=BaseResponseModel
+                model_response_data=BaseResponseModel,
+                idempotent=False,
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.add_items_to_order.__name__,
-                                 f"Не удалось получить заказы: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.add_items_to_order.__name__,
@@ -717,13 +1262,10 @@ class Orders(BaseAPI):
             return self._post_request(
                 url="/api/1/order/change_payments",
                 data=data.dict(),
-                model_response_data=BaseResponseModel
+                model_response_data=BaseResponseModel,
+                idempotent=False,
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.change_order_payments.__name__,
-                                 f"Не удалось получить заказы: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.change_order_payments.__name__,
@@ -737,13 +1279,10 @@ class Orders(BaseAPI):
             return self._post_request(
                 url="/api/1/order/by_table",
                 data=data.dict(),
-                model_response_data=BaseResponseModel
+                model_response_data=BaseResponseModel,
+                idempotent=False,
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.init_orders_by_tables.__name__,
-                                 f"Не удалось получить заказы: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.init_orders_by_tables.__name__,
@@ -770,12 +1309,9 @@ class Deliveries(BaseAPI):
             return self._post_request(
                 url="/api/1/delivery/create",
                 data=data,
-                model_response_data=BaseCreatedDeliveryOrderInfoModel
+                model_response_data=BaseCreatedDeliveryOrderInfoModel,
+                idempotent=order.get("id") is not None,
             )
-        except requests.exceptions.RequestException as err:
-            raise PostException(self.__class__.__qualname__,
-                                self.delivery_create.__name__,
-                                f"Не удалось создать заказ из за: \n{err}")
         except TypeError as err:
             raise TypeError(self.__class__.__qualname__,
                             self.delivery_create.__name__,
@@ -810,12 +1346,9 @@ class Deliveries(BaseAPI):
             return self._post_request(
                 url="/api/1/deliveries/update_order_delivery_status",
                 data=data,
-                model_response_data=BaseResponseModel
+                model_response_data=BaseResponseModel,
+                idempotent=False,
             )
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.update_order_delivery_status.__name__,
-                                 f"Не удалось изменить статус: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.update_order_delivery_status.__name__,
@@ -843,12 +1376,9 @@ class Deliveries(BaseAPI):
                 url="/api/1/deliveries/confirm",
                 data=data,
                 model_response_data=BaseResponseModel,
+                idempotent=False,
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.confirm.__name__,
-                                 f"Не удалось изменить статус: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.confirm.__name__,
@@ -876,13 +1406,10 @@ class Deliveries(BaseAPI):
             return self._post_request(
                 url="/api/1/deliveries/cancel_confirmation",
                 data=data,
-                model_response_data=BaseResponseModel
+                model_response_data=BaseResponseModel,
+                idempotent=False,
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.cancel_confirmation.__name__,
-                                 f"Не удалось изменить статус: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.cancel_confirmation.__name__,
@@ -954,26 +1481,171 @@ class Deliveries(BaseAPI):
                 model_response_data=ByDeliveryDateAndStatusModel
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.by_delivery_date_and_status.__name__,
-                                 f"Не удалось получить заказы: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.by_delivery_date_and_status.__name__,
                                  f"Не удалось: \n{err}")
 
-    @experimental("будет дописан в будущем!")
-    def by_revision(self):
-        # Retrieve list of orders changed from the time revision was passed.
+    def by_delivery_date_and_status_windows(self,
+                                            organization_id: List[str],
+                                            delivery_date_from: Union[datetime, str],
+                                            delivery_date_to: Union[datetime, str],
+                                            window: Union[timedelta, str] = "day",
+                                            statuses: list = None,
+                                            source_keys: list = None,
+                                            max_workers: int = 4,
+                                            timeout: float = None
+                                            ) -> Iterator[Tuple[OrderRetrieveModel, bool]]:
+        """
+        by_delivery_date_and_status для больших периодов: период делится на окна window, окна запрашиваются
+        параллельно, пары (order, replaces_previous) отдаются по мере получения окон. В памяти одновременно не больше
+        max_workers ответов окон: следующее окно запрашивается, когда готовый ответ забрали. Границы соседних окон
+        совпадают, поэтому заказ может прийти в двух окнах: повтор с тем же или меньшим timestamp пропускается, более
+        новая копия отдаётся с replaces_previous=True и заменяет ранее отданный заказ с тем же id.
+        Ответ iiko с ошибкой или исключение окна прерывает итерацию. Для AsyncIikoTransport - асинхронный итератор.
+
+            for order, replaces_previous in api.by_delivery_date_and_status_windows(organization_ids, month_start,
+                                                                                    month_end, "day"):
+                save(order, replace=replaces_previous)
+
+        :param organization_id: Organizations IDs.
+        :param delivery_date_from: datetime or "%Y-%m-%d %H:%M:%S.%f". Order delivery date (Local for delivery terminal). Lower limit.
+        :param delivery_date_to: datetime or "%Y-%m-%d %H:%M:%S.%f". Order delivery date (Local for delivery terminal). Upper limit.
+        :param window: timedelta or "hour", "day" - size of one request's period
+        :param statuses: Allowed order statuses, see by_delivery_date_and_status.
+        :param source_keys: Source keys.
+        :param max_workers: maximum number of simultaneous requests
+        :param timeout: timeout of one window request, seconds
+        :return: (order, replaces_previous) pairs
+        """
+        window = DELIVERY_WINDOWS.get(window) if isinstance(window, str) else window
+        if not isinstance(window, timedelta) or window <= timedelta(0):
+            raise ParamSetException(self.__class__.__qualname__,
+                                    self.by_delivery_date_and_status_windows.__name__,
+                                    f"window должен быть положительным timedelta или одним из {list(DELIVERY_WINDOWS)}")
+        bounds = []
+        for value in (delivery_date_from, delivery_date_to):
+            if isinstance(value, datetime):
+                bounds.append(value)
+            elif isinstance(value, str):
+                bounds.append(datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f"))
+            else:
+                raise TypeError("type delivery_date_from, delivery_date_to != datetime or str")
+        start, end = bounds
+
+        def windows(start: datetime):
+            # границы соседних окон совпадают, повторы на границе убираются по id;
+            # окна создаются по мере освобождения workers
+            while start < end:
+                window_end = min(start + window, end)
+                yield (start, window_end), functools.partial(
+                    self.by_delivery_date_and_status, organization_id, start, window_end, statuses, source_keys)
+                start = window_end
+
+        seen: Dict[str, int] = {}
+        name = self.by_delivery_date_and_status_windows.__name__
+
+        def emit(result: CallResult):
+            if not result.ok:
+                if isinstance(result.error, CustomErrorModel):
+                    window_from, window_to = result.key
+                    raise PostException(self.__class__.__qualname__, name,
+                                        f"Не удалось получить заказы за {window_from:{self.strfdt}} - "
+                                        f"{window_to:{self.strfdt}}: \n{result.error.error_description}")
+                raise result.error
+            for organization in result.value.orders_by_organizations or ():
+                for order in organization.orders or ():
+                    timestamp = seen.get(order.id)
+                    if timestamp is None or order.timestamp > timestamp:
+                        seen[order.id] = order.timestamp
+                        yield order, timestamp is not None
+
+        return self._stream_parallel(windows(start), emit, max_workers, timeout, parse_mode=PARSE_FULL)
+
+    def by_revision(self, organization_id: List[str], start_revision: int,
+                    source_keys: list = None) -> Union[ByRevisionModel, CustomErrorModel]:
+        """
+        Заказы, изменённые после ревизии start_revision (для ленты изменений см. deliveries.DeliveryChangeFeed)
+        :param organization_id: Organizations IDs.
+        :param start_revision: Revision from which the changes are retrieved, the next request uses max_revision of the response.
+        :param source_keys: Source keys.
+        :return:
+        """
         # https://api-ru.iiko.services/api/1/deliveries/by_revision
-        pass
+        data = {
+            "startRevision": start_revision,
+            "organizationIds": organization_id,
+        }
+        if source_keys is not None:
+            if not isinstance(source_keys, list):
+                raise TypeError("type source_keys != list")
+            data["sourceKeys"] = source_keys
 
-    @experimental("будет дописан в будущем!")
-    def by_delivery_date_and_phone(self):
-        # Retrieve list of orders changed from the time revision was passed.
+        try:
+            return self._post_request(
+                url="/api/1/deliveries/by_revision",
+                data=data,
+                model_response_data=ByRevisionModel
+            )
+
+        except TypeError as err:
+            raise TokenException(self.__class__.__qualname__,
+                                 self.by_revision.__name__,
+                                 f"Не удалось: \n{err}")
+
+    def by_delivery_date_and_phone(self,
+                                   organization_id: List[str],
+                                   phone: str,
+                                   delivery_date_from: Union[datetime, str] = None,
+                                   delivery_date_to: Union[datetime, str] = None,
+                                   start_revision: int = None,
+                                   source_keys: list = None
+                                   ) -> Union[ByDeliveryDateAndPhoneModel, CustomErrorModel]:
+        """
+        Заказы по номеру телефона, датам и ревизии (кэш с объединением одновременных запросов -
+        deliveries.PhoneLookupCache)
+        :param organization_id: Organizations IDs.
+        :param phone: Customer phone number, E.164 ("+79990000000").
+        :param delivery_date_from: datetime or "%Y-%m-%d %H:%M:%S.%f". Order delivery date (Local for delivery terminal). Lower limit.
+        :param delivery_date_to: datetime or "%Y-%m-%d %H:%M:%S.%f". Order delivery date (Local for delivery terminal). Upper limit.
+        :param start_revision: Revision from which the orders are retrieved.
+        :param source_keys: Source keys.
+        :return:
+        """
         # https://api-ru.iiko.services/api/1/deliveries/by_delivery_date_and_phone
-        pass
+        data = {
+            "phone": phone,
+            "organizationIds": organization_id,
+        }
+        for key, value in (("deliveryDateFrom", delivery_date_from), ("deliveryDateTo", delivery_date_to)):
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                data[key] = value.strftime(self.strfdt)
+            elif isinstance(value, str):
+                data[key] = value
+            else:
+                raise TypeError(f"type {key} != datetime or str")
+
+        if start_revision is not None:
+            data["startRevision"] = start_revision
+
+        if source_keys is not None:
+            if not isinstance(source_keys, list):
+                raise TypeError("type source_keys != list")
+            data["sourceKeys"] = source_keys
+
+        try:
+            return self._post_request(
+                url="/api/1/deliveries/by_delivery_date_and_phone",
+                data=data,
+                model_response_data=ByDeliveryDateAndPhoneModel
+            )
+
+        except TypeError as err:
+            raise TokenException(self.__class__.__qualname__,
+                                 self.by_delivery_date_and_phone.__name__,
+                                 f"Не удалось: \n{err}")
 
     def by_delivery_date_and_source_key_and_filter(self,
                                                    organization_id: List[str],
@@ -1094,10 +1766,6 @@ class Deliveries(BaseAPI):
                 model_response_data=ByDeliveryDateAndSourceKeyAndFilter,
             )
 
-        except requests.exceptions.RequestException as err:
-            raise TokenException(self.__class__.__qualname__,
-                                 self.by_delivery_date_and_status.__name__,
-                                 f"Не удалось получить заказы: \n{err}")
         except TypeError as err:
             raise TokenException(self.__class__.__qualname__,
                                  self.by_delivery_date_and_status.__name__,
@@ -1119,10 +1787,6 @@ class Employees(BaseAPI):
                 data=data,
                 model_response_data=CouriersModel
             )
-        except requests.exceptions.RequestException as err:
-            raise PostException(self.__class__.__qualname__,
-                                self.couriers.__name__,
-                                f"Не удалось получить курьеров: \n{err}")
         except TypeError as err:
             raise PostException(self.__class__.__qualname__,
                                 self.couriers.__name__,
@@ -1150,15 +1814,47 @@ class Reserve(BaseAPI):
                 data=data,
                 model_response_data=AvailableRestaurantSections
             )
-        except requests.exceptions.RequestException as err:
-            raise PostException(self.__class__.__qualname__,
-                                self.available_restaurant_sections.__name__,
-                                f"{err}")
         except TypeError as err:
             raise PostException(self.__class__.__qualname__,
                                 self.available_restaurant_sections.__name__,
                                 f"{err}")
 
 
-class IikoTransport(Orders, Deliveries, Employees, Address, TerminalGroup, Menu, Dictionaries, Reserve):
+class ReferenceData(BaseAPI):
+    def load_reference_snapshot(self, organization_ids: List[str] = None, max_workers: int = 9,
+                                timeout: float = None) -> ReferenceSnapshot:
+        """
+        Загрузить справочники организаций параллельно: organizations, cancel_causes, order_types, discounts,
+        payment_types, removal_types, tips_types, terminal_groups, couriers.
+        Ошибка одной части не прерывает загрузку остальных, она попадает в ReferenceSnapshot.errors.
+        Для AsyncIikoTransport - корутина.
+        :param organization_ids: Organizations IDs, by default api.organizations_ids
+        :param max_workers: maximum number of simultaneous requests
+        :param timeout: timeout of one part, seconds
+        :return: ReferenceSnapshot
+        """
+        if organization_ids is None:
+            organization_ids = self.organizations_ids
+        if not organization_ids:
+            raise ParamSetException(self.__class__.__qualname__,
+                                    self.load_reference_snapshot.__name__,
+                                    f"Не заданы organization_ids и не загружены организации (api.organizations())")
+        organization_ids = list(organization_ids)
+        calls = [
+            ("organizations", lambda: self.organizations(organization_ids)),
+            ("cancel_causes", lambda: self.cancel_causes(organization_ids)),
+            ("order_types", lambda: self.order_types(organization_ids)),
+            ("discounts", lambda: self.discounts(organization_ids)),
+            ("payment_types", lambda: self.payment_types(organization_ids)),
+            ("removal_types", lambda: self.removal_types(organization_ids)),
+            ("tips_types", lambda: self.tips_types()),
+            ("terminal_groups", lambda: self.terminal_groups(organization_ids)),
+            ("couriers", lambda: self.couriers(organization_ids)),
+        ]
+        return self._run_parallel(calls, lambda results: ReferenceSnapshot(organization_ids, results),
+                                  max_workers, timeout, PARSE_FULL)
+
+
+class IikoTransport(Orders, Deliveries, Employees, Address, TerminalGroup, Menu, Dictionaries, Reserve,
+                    ReferenceData):
     pass
@@ -0,0 +1,406 @@
+import asyncio
+import functools
+import warnings
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import AsyncIterator, Callable, Dict, Optional, List, Union
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+from pyiikocloudapi.api import _NOT_PARSED, BaseAPI, Orders, Deliveries, Employees, Address, TerminalGroup, Menu, \
+    Dictionaries, Reserve, ReferenceData
+from pyiikocloudapi.cache import ResponseCache
+from pyiikocloudapi.concurrency import CallResult, aiter_parallel, run_parallel_async
+from pyiikocloudapi.exception import CheckTimeToken, TokenException
+from pyiikocloudapi.hooks import HookEvent
+from pyiikocloudapi.metrics import Metrics
+from pyiikocloudapi.parsing import PARSE_FULL, parsing
+from pyiikocloudapi.ratelimit import RateLimiter
+from pyiikocloudapi.retry import RetryPolicy
+from pyiikocloudapi.sharding import Sharding
+from pyiikocloudapi.streaming import AsyncByteStream, StreamParser, ijson
+from pyiikocloudapi.token_store import TokenStore
+from pyiikocloudapi.transport import TransportConfig
+from pyiikocloudapi.models import CustomErrorModel
+
+
+async def _await_parsing(mode: str, func):
+    with parsing(mode):
+        return await func()
+
+
+class AsyncBaseAPI(BaseAPI):
+    """
+    Асинхронная база клиента на httpx.AsyncClient.
+
+    Методы миксинов (Orders, Deliveries, Menu ...) общие с синхронным клиентом: здесь переопределён только
+    транспорт, поэтому каждый метод возвращает корутину, которую нужно ожидать через await.
+    Маркер доступа запрашивается при первом запросе (или явно через await access_token()).
+    """
+
+    def __init__(self, api_login: str, client: Optional["httpx.AsyncClient"] = None, debug: bool = False,
+                 base_url: str = None, working_token: str = None, base_headers: dict = None, codec=None,
+                 metrics: Union[bool, Metrics] = False, retry_policy: Union[bool, RetryPolicy] = True,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 token_refresh_interval: Optional[timedelta] = timedelta(minutes=45),
+                 token_store: Optional[TokenStore] = None, transport: Optional[TransportConfig] = None,
+                 parse_mode: str = PARSE_FULL, model_backend: str = "pydantic",
+                 cache: Union[bool, ResponseCache] = False, sharding: Union[bool, Sharding] = False):
+        """
+
+        :param api_login: login api iiko cloud
+        :param client: httpx.AsyncClient, общий пул соединений для всех корутин (по умолчанию создаётся по transport)
+        :param debug: print request and response (subscribes print_hook to api.hooks)
+        :param base_url: url iiko cloud api
+        :param working_token: Initialize an object based on a working token, that is, without requesting a new one
+        :param base_headers: base header for request in iiko cloud api
+        :param codec: JSON codec: "orjson", "msgspec", "json" or object with dumps/loads, by default the fastest installed
+        :param metrics: True or Metrics object (can be shared between clients) to collect per-endpoint metrics
+        :param retry_policy: RetryPolicy for transient errors (408, 429, 5xx, connection errors), True - default policy,
+        False - no retries. Only idempotent requests are retried
+        :param rate_limiter: client-side limiter, see RateLimiter.for_login
+        :param token_refresh_interval: token age after which it is refreshed before the next request
+        (token lifetime is ~60 minutes), None - refresh only on 401
+        :param token_store: shared token storage (MemoryTokenStore, FileTokenStore, SQLiteTokenStore), a still valid
+        token from the store is reused instead of requesting a new one
+        :param transport: connection pool and timeouts settings
+        :param parse_mode: response parsing: "full", "lazy", "raw" or "bytes", see IikoTransport
+        :param model_backend: "pydantic" or "msgspec", see IikoTransport
+        :param cache: True or ResponseCache - TTL/LRU cache of Dictionaries responses, stale responses are refreshed
+        in background tasks
+        :param sharding: True or Sharding - split long organizationIds lists into concurrent requests
+        """
+        if httpx is None:
+            raise ImportError("Для AsyncIikoTransport необходим httpx: pip install pyiikocloudapi[async]")
+
+        transport = transport if transport is not None else TransportConfig()
+        self.__client = client if client is not None else httpx.AsyncClient(transport=transport.httpx_transport())
+        self.__token_lock = asyncio.Lock()
+        self.__refresher: Optional[asyncio.Task] = None
+        self.__background = set()
+        super().__init__(api_login, debug=debug, base_url=base_url, working_token=working_token,
+                         base_headers=base_headers, codec=codec, metrics=metrics, retry_policy=retry_policy,
+                         rate_limiter=rate_limiter, token_refresh_interval=token_refresh_interval,
+                         token_store=token_store, transport=transport, parse_mode=parse_mode,
+                         model_backend=model_backend, cache=cache,
+                         sharding=sharding)
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """Вывести httpx клиент"""
+        return self.__client
+
+    def pool_stats(self) -> Dict[str, dict]:
+        """
+        Состояние пула соединений httpx: in_use и idle соединения по хостам. Приблизительно: у httpx нет
+        публичного API пула, читаются внутренние атрибуты httpcore, если их нет - пустой словарь
+        """
+        stats = {}
+        pool = getattr(getattr(self.__client, "_transport", None), "_pool", None)
+        for connection in getattr(pool, "connections", None) or ():
+            is_idle = getattr(connection, "is_idle", None)
+            if is_idle is None:
+                continue
+            origin = str(getattr(connection, "_origin", "unknown"))
+            item = stats.setdefault(origin, {"in_use": 0, "idle": 0})
+            item["idle" if is_idle() else "in_use"] += 1
+        return stats
+
+    def _create_session(self, session, transport: Optional[TransportConfig]):
+        # Запросы идут через httpx.AsyncClient, requests.Session не нужна
+        return None
+
+    def _init_access_token(self):
+        # Без сетевого ввода-вывода в конструкторе: маркер будет запрошен при первом запросе
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Закрыть пул соединений"""
+        self.stop_token_refresher()
+        await self.__client.aclose()
+
+    async def access_token(self):
+        """Получить маркер доступа"""
+        try:
+            result = await self.__client.post(f'{self.base_url}/api/1/access_token',
+                                              content=self.codec.dumps({"apiLogin": self.api_login}),
+                                              headers={"Content-Type": "application/json"},
+                                              timeout=self.transport.httpx_timeout("/api/1/access_token"))
+
+            response_data: dict = self.codec.loads(result.content)
+            if response_data.get("errorDescription", None) is not None:
+                raise TypeError(f'{response_data=}')
+
+            if response_data.get("token", None) is not None:
+                self._set_token(response_data.get("token", ""))
+
+        except httpx.HTTPError as err:
+            raise TokenException(self.__class__.__qualname__,
+                                 "access_token",
+                                 f"Не удалось получить маркер доступа: \n{err}")
+        except (TypeError, ValueError) as err:
+            raise TokenException(self.__class__.__qualname__,
+                                 "access_token",
+                                 f"Не удалось получить маркер доступа: \n{err}")
+
+    async def _refresh_token(self, stale_token: Optional[str]):
+        """Обновить маркер доступа, параллельные корутины дожидаются одного обновления"""
+        async with self.__token_lock:
+            if self.token is not None and self.token != stale_token:
+                return
+            if self.token_store is None:
+                await self.access_token()
+                return
+            # Блокировка хранилища может ждать другой процесс, а get/set читают файл или SQLite,
+            # поэтому всё это выполняется вне event loop
+            loop = asyncio.get_running_loop()
+            lock = self.token_store.lock(self.api_login, self.base_url)
+            acquire = loop.run_in_executor(None, lock.__enter__)
+
+            def release_acquired(future: asyncio.Future):
+                if not future.cancelled() and future.exception() is None:
+                    lock.__exit__(None, None, None)
+
+            try:
+                await asyncio.shield(acquire)
+            except asyncio.CancelledError:
+                # Поток всё равно захватит блокировку: освобождаем её сразу после захвата
+                acquire.add_done_callback(release_acquired)
+                raise
+            try:
+                if await loop.run_in_executor(None, self._token_from_store, stale_token):
+                    return
+                await self.access_token()
+                await loop.run_in_executor(None, self._token_to_store)
+            finally:
+                await asyncio.shield(loop.run_in_executor(None, lock.__exit__, None, None, None))
+
+    async def _ensure_token(self):
+        if self._token_expired():
+            await self._refresh_token(self.token)
+
+    async def __open_connection(self):
+        try:
+            await self.__client.head(self.base_url, timeout=self.transport.httpx_timeout())
+        except httpx.HTTPError:
+            pass
+
+    async def warmup(self, connections: int = 4, organizations: bool = True):
+        """
+        Подготовить клиент к работе: запросить маркер доступа и одновременно открыть TLS соединения в пуле,
+        затем запросить организации (api.organizations_ids)
+        :param connections: number of connections to open in parallel with the token request
+        :param organizations: request organizations
+        :return: result of organizations() or None
+        """
+        await asyncio.gather(self._ensure_token(), *(self.__open_connection() for _ in range(connections)))
+        if organizations:
+            return await self.organizations()
+
+    def start_token_refresher(self, check_interval: float = 60.0):
+        """Запустить фоновое обновление маркера доступа (задача asyncio в текущем event loop)"""
+        if self.__refresher is not None and not self.__refresher.done():
+            return
+
+        async def run():
+            while True:
+                await asyncio.sleep(check_interval)
+                try:
+                    await self._ensure_token()
+                except Exception as err:
+                    warnings.warn(f"Не удалось обновить маркер доступа: {err!r}", RuntimeWarning)
+
+        self.__refresher = asyncio.get_running_loop().create_task(run())
+
+    def stop_token_refresher(self):
+        """Остановить фоновое обновление маркера доступа"""
+        if self.__refresher is not None:
+            self.__refresher.cancel()
+            self.__refresher = None
+
+    async def check_status_code_token(self, code: Union[str, int]):
+        if str(code) == "401":
+            await self.access_token()
+
+    async def check_token_time(self) -> bool:
+        """
+        Проверка на время жизни маркера доступа
+        :return: Если прошло 15 мин будет запрошен токен и метод вернёт True, иначе вернётся False
+        """
+        fifteen_minutes_ago = datetime.now() - timedelta(minutes=15)
+        if self.time_token is None:
+            raise CheckTimeToken(
+                self.__class__.__qualname__,
+                "check_token_time",
+                "Не запрошен Token и не присвоен объект типа datetime.datetime")
+        if self.time_token <= fifteen_minutes_ago:
+            await self.access_token()
+            return True
+        return False
+
+    async def _post_request(self, url: str, data: dict = None, model_response_data=None,
+                            model_error=CustomErrorModel, idempotent: bool = True):
+        key, value, found = self._cache_lookup(url, data, model_response_data, model_error)
+        if found:
+            return value
+        out = await self._fetch(url, data, model_response_data, model_error, idempotent)
+        return out if key is None else self._cache_result(key, out)
+
+    def _start_refresh(self, key, url: str, data: dict, model_response_data, model_error):
+        task = asyncio.get_running_loop().create_task(
+            self._refresh_cached(key, url, data, model_response_data, model_error))
+        self.__background.add(task)
+        task.add_done_callback(self.__background.discard)
+
+    async def _refresh_cached(self, key, url: str, data: dict, model_response_data, model_error):
+        try:
+            self._cache_result(key, await self._fetch(url, data, model_response_data, model_error))
+        except Exception as err:
+            warnings.warn(f"Не удалось обновить кэш {url}: {err!r}", RuntimeWarning)
+        finally:
+            self.cache.end_refresh(key)
+
+    async def _send_with_retry(self, url: str, body: bytes, idempotent: bool = True, stream: bool = False):
+        """_send_with_retry на httpx: ошибки httpx пробрасываются как TransportException"""
+        await self._ensure_token()
+        hooks = self.hooks
+        policy = self.retry_policy if idempotent else None
+        if policy is not None:
+            policy.budget.deposit()
+
+        limiter = self.rate_limiter
+        first_start = perf_counter()
+        attempt = 0
+        token_refreshed = False
+        while True:
+            if limiter is not None:
+                await limiter.acquire_async(url)
+            if hooks.request:
+                hooks.emit(hooks.request, HookEvent(url, body))
+            token = self.token
+            start = perf_counter()
+            request = self.__client.build_request("POST", f'{self.base_url}{url}', content=body,
+                                                  headers=self.headers, timeout=self.transport.httpx_timeout(url))
+            try:
+                result = await self.__client.send(request, stream=stream)
+            except httpx.HTTPError as err:
+                if hooks.error:
+                    hooks.emit(hooks.error, HookEvent(url, body, elapsed=perf_counter() - start, error=err))
+                if policy is not None and isinstance(err, httpx.TransportError):
+                    delay = policy.next_delay(attempt, perf_counter() - first_start)
+                    if delay is not None:
+                        await asyncio.sleep(delay)
+                        attempt += 1
+                        continue
+                raise self._transport_error(url, err) from err
+
+            if result.status_code == 401 and not token_refreshed:
+                if hooks.error:
+                    hooks.emit(hooks.error, HookEvent(url, body, result.status_code,
+                                                      None if stream else result.content, perf_counter() - start))
+                await result.aclose()
+                await self._refresh_token(token)
+                token_refreshed = True
+                continue
+
+            if policy is not None and policy.is_retryable_status(result.status_code):
+                delay = policy.next_delay(attempt, perf_counter() - first_start)
+                if delay is not None:
+                    if hooks.error:
+                        hooks.emit(hooks.error, HookEvent(url, body, result.status_code,
+                                                          None if stream else result.content,
+                                                          perf_counter() - start))
+                    await result.aclose()
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+            return result, start
+
+    async def _send_request(self, url: str, data: dict = None, model_response_data=None,
+                            model_error=CustomErrorModel, idempotent: bool = True):
+        if data is None:
+            data = {}
+
+        body = self.codec.dumps(data)
+        result, start = await self._send_with_retry(url, body, idempotent)
+
+        out = self._parse_direct(url, body, result.status_code, result.content, perf_counter() - start,
+                                 model_response_data)
+        if out is not _NOT_PARSED:
+            return out
+
+        response_data = self._loads_response(url, body, result.status_code, result.content, start)
+        return self._parse_response(url, body, result.status_code, result.content, response_data,
+                                    perf_counter() - start, model_response_data, model_error)
+
+    async def _post_stream(self, url: str, data: dict, parser: StreamParser, model_error=CustomErrorModel):
+        body = self.codec.dumps(data)
+        hooks = self.hooks
+        result, start = await self._send_with_retry(url, body, stream=True)
+
+        try:
+            if result.status_code != 200:
+                content = await result.aread()
+                response_data = self._loads_response(url, body, result.status_code, content, start)
+                out = self._parse_response(url, body, result.status_code, content, response_data,
+                                           perf_counter() - start, None, model_error)
+                if isinstance(out, dict):
+                    out = model_error.parse_obj(out)
+                    out.status_code = result.status_code
+                yield "error", out
+                return
+
+            async for prefix, event, value in ijson.parse_async(AsyncByteStream(result.aiter_bytes()),
+                                                                use_float=True):
+                item = parser.event(prefix, event, value)
+                if item is not None:
+                    yield item
+            values = parser.finish()
+            if hooks.response:
+                hooks.emit(hooks.response, HookEvent(url, body, result.status_code, None, perf_counter() - start,
+                                                     dict(values).get("correlation_id")))
+            for item in values:
+                yield item
+        finally:
+            await result.aclose()
+
+    async def _run_parallel(self, calls, build, max_workers: int = 8, timeout: float = None,
+                            parse_mode: str = None):
+        if parse_mode is not None:
+            calls = [(key, functools.partial(_await_parsing, parse_mode, func)) for key, func in calls]
+        return build(await run_parallel_async(calls, max_workers, timeout))
+
+    async def _stream_parallel(self, calls, emit, max_workers: int = 8, timeout: float = None,
+                               parse_mode: str = None) -> AsyncIterator:
+        if parse_mode is not None:
+            calls = ((key, functools.partial(_await_parsing, parse_mode, func)) for key, func in calls)
+        async for result in aiter_parallel(calls, max_workers, timeout):
+            for item in emit(result):
+                yield item
+
+    def fan_out(self, method: Union[str, Callable], organization_ids: List[str], *args, max_workers: int = 8,
+                timeout: float = None, ordered: bool = False, **kwargs) -> AsyncIterator[CallResult]:
+        """fan_out для корутин: асинхронный итератор CallResult, не больше max_workers одновременных запросов"""
+        return aiter_parallel(self._fan_out_calls(method, organization_ids, args, kwargs), max_workers, timeout,
+                              ordered)
+
+    async def organizations(self, organization_ids: List[str] = None, return_additional_info: bool = None,
+                            include_disabled: bool = None):
+        response_data = await super().organizations(organization_ids, return_additional_info, include_disabled)
+        if hasattr(response_data, "organizations") or isinstance(response_data, dict):
+            self._convert_org_data(data=response_data)
+        return response_data
+
+
+class AsyncIikoTransport(AsyncBaseAPI, Orders, Deliveries, Employees, Address, TerminalGroup, Menu, Dictionaries,
+                         Reserve, ReferenceData):
+    pass
@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+DICTIONARY_TTLS = {
+    "/api/1/cancel_causes": 3600.0,
+    "/api/1/deliveries/order_types": 3600.0,
+    "/api/1/discounts": 600.0,
+    "/api/1/payment_types": 3600.0,
+    "/api/1/removal_types": 3600.0,
+    "/api/1/tips_types": 3600.0,
+}
+
+FRESH = "fresh"
+STALE = "stale"
+
+
+class CacheStats:
+    """Счётчики кэша: hits - свежие ответы, stale_hits - устаревшие ответы (с обновлением в фоне),
+    misses - запросы к iiko, refreshes - фоновые обновления, evictions - вытеснения по LRU"""
+    __slots__ = ("hits", "stale_hits", "misses", "refreshes", "evictions")
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"CacheStats({self.as_dict()})"
+
+
+class ResponseCache:
+    """
+    TTL + LRU кэш ответов медленно меняющихся справочников (Dictionaries). Ключ - url, отсортированный
+    organizationIds, остальные параметры запроса, режим разбора и model_backend. Кэшируются только успешные ответы.
+    После ttl ответ ещё stale_ttl секунд отдаётся из кэша, а в фоне запрашивается новый (stale-while-revalidate).
+
+        cache = ResponseCache(ttls={"/api/1/discounts": 60})
+        api = IikoTransport(api_login, cache=cache)
+        cache.invalidate("/api/1/discounts")
+        cache.stats
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, maxsize: int = 512, stale_ttl: float = 300.0):
+        """
+        :param ttls: cached urls and their TTL in seconds, merged with DICTIONARY_TTLS
+        :param maxsize: maximum number of cached responses (least recently used are evicted)
+        :param stale_ttl: how long after TTL a stale response is returned while it is refreshed in background
+        """
+        self.ttls = dict(DICTIONARY_TTLS)
+        self.ttls.update(ttls or {})
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self.stats = CacheStats()
+        self.__items: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self.__refreshing = set()
+        self.__lock = threading.Lock()
+
+    def cacheable(self, url: str) -> bool:
+        return url in self.ttls
+
+    @staticmethod
+    def key(url: str, data: Optional[dict], mode: str = "", backend: str = "") -> Hashable:
+        """
+        :param mode: parse mode of the response
+        :param backend: model backend of the response (one cache can be shared by clients with different backends)
+        """
+        data = data or {}
+        organization_ids = data.get("organizationIds")
+        rest = tuple(sorted((name, repr(value)) for name, value in data.items() if name != "organizationIds"))
+        return url, tuple(sorted(organization_ids or ())), rest, mode, backend
+
+    def get(self, key: Hashable) -> Tuple[object, Optional[str]]:
+        """(ответ, FRESH | STALE) или (None, None), если ответа нет или он устарел больше чем на stale_ttl"""
+        with self.__lock:
+            item = self.__items.get(key)
+            if item is None:
+                self.stats.misses += 1
+                return None, None
+            expires, value = item
+            now = monotonic()
+            if now < expires:
+                self.__items.move_to_end(key)
+                self.stats.hits += 1
+                return value, FRESH
+            if now < expires + self.stale_ttl:
+                self.__items.move_to_end(key)
+                self.stats.stale_hits += 1
+                return value, STALE
+            del self.__items[key]
+            self.stats.misses += 1
+            return None, None
+
+    def set(self, key: Hashable, value):
+        with self.__lock:
+            self.__items[key] = (monotonic() + self.ttls.get(key[0], 0.0), value)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.maxsize:
+                self.__items.popitem(last=False)
+                self.stats.evictions += 1
+
+    def begin_refresh(self, key: Hashable) -> bool:
+        """Отметить начало фонового обновления, False - ключ уже обновляется"""
+        with self.__lock:
+            if key in self.__refreshing:
+                return False
+            self.__refreshing.add(key)
+            self.stats.refreshes += 1
+            return True
+
+    def end_refresh(self, key: Hashable):
+        with self.__lock:
+            self.__refreshing.discard(key)
+
+    def invalidate(self, url: Optional[str] = None, organization_ids: Optional[Iterable[str]] = None):
+        """
+        Удалить ответы из кэша: все, по url и/или по организациям (ответы, в запросе которых есть любая из них)
+        """
+        organization_ids = set(organization_ids or ())
+        with self.__lock:
+            for key in list(self.__items):
+                if url is not None and key[0] != url:
+                    continue
+                if organization_ids and not organization_ids.intersection(key[1]):
+                    continue
+                del self.__items[key]
+
+    def __len__(self):
+        return len(self.__items)
@@ -0,0 +1,189 @@
+import asyncio
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from time import perf_counter
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+from pyiikocloudapi.models import CustomErrorModel
+
+
+class CallResult:
+    """
+    Результат одного вызова параллельного выполнения: key (для fan_out - organization_id), value - ответ,
+    error - исключение, TimeoutError или CustomErrorModel (ответ iiko с ошибкой), elapsed - время вызова
+    """
+    __slots__ = ("key", "value", "error", "elapsed")
+
+    def __init__(self, key: Hashable, value=None, error=None, elapsed: float = 0.0):
+        self.key = key
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def organization_id(self):
+        return self.key
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return f"CallResult(key={self.key!r}, ok={self.ok}, elapsed={self.elapsed:.3f})"
+
+
+def _result(key: Hashable, value, elapsed: float) -> CallResult:
+    if isinstance(value, CustomErrorModel):
+        return CallResult(key, value, value, elapsed)
+    return CallResult(key, value, None, elapsed)
+
+
+def _timeout_error(key: Hashable, timeout: float) -> TimeoutError:
+    return TimeoutError(f"Вызов {key!r} не завершился за {timeout} с")
+
+
+def iter_parallel(calls: Iterable[Tuple[Hashable, Callable[[], object]]], max_workers: int = 8,
+                  timeout: Optional[float] = None, ordered: bool = False) -> Iterator[CallResult]:
+    """
+    Выполнить вызовы в пуле потоков и отдавать CallResult по мере завершения (ordered=True - в порядке calls).
+    calls читается лениво: выполняемых вызовов вместе с готовыми, но ещё не отданными результатами не больше
+    max_workers, следующий вызов запускается только после того, как результат забрали.
+    Исключения не пробрасываются, а попадают в CallResult.error.
+    timeout отсчитывается от начала выполнения вызова: после него отдаётся результат с TimeoutError,
+    а сам вызов дорабатывает в фоне (поток прервать нельзя).
+    """
+    calls = iter(calls)
+    max_workers = max(1, max_workers)
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="iiko-parallel")
+    started: Dict[int, float] = {}
+    futures: Dict[Future, Tuple[int, Hashable]] = {}
+    results: Dict[int, CallResult] = {}
+    submitted = 0
+    next_index = 0
+    exhausted = False
+
+    def run(index: int, func: Callable[[], object]):
+        started[index] = perf_counter()
+        try:
+            return func(), None, perf_counter() - started[index]
+        except Exception as err:
+            return None, err, perf_counter() - started[index]
+
+    def submit():
+        nonlocal submitted, exhausted
+        while not exhausted and len(futures) + len(results) < max_workers:
+            try:
+                key, func = next(calls)
+            except StopIteration:
+                exhausted = True
+                return
+            futures[executor.submit(contextvars.copy_context().run, run, submitted, func)] = (submitted, key)
+            submitted += 1
+
+    def collect(done: Iterable[Future]):
+        # в отдельной функции, чтобы завершённые futures (и их ответы) не оставались в локальных переменных
+        for future in done:
+            index, key = futures.pop(future)
+            started.pop(index, None)
+            value, error, elapsed = future.result()
+            if error is not None:
+                results[index] = CallResult(key, error=error, elapsed=elapsed)
+            else:
+                results[index] = _result(key, value, elapsed)
+        if timeout is not None:
+            now = perf_counter()
+            for future, (index, key) in list(futures.items()):
+                start = started.get(index)
+                if start is not None and now - start >= timeout:
+                    del futures[future]
+                    del started[index]
+                    results[index] = CallResult(key, error=_timeout_error(key, timeout), elapsed=now - start)
+
+    try:
+        submit()
+        while futures:
+            wait_timeout = None
+            if timeout is not None:
+                now = perf_counter()
+                deadlines = [started[index] + timeout - now for index, _ in futures.values() if index in started]
+                wait_timeout = max(0.0, min(deadlines + [timeout]))
+            collect(wait(list(futures), timeout=wait_timeout, return_when=FIRST_COMPLETED)[0])
+            if ordered:
+                while next_index in results:
+                    next_index += 1
+                    yield results.pop(next_index - 1)
+            else:
+                while results:
+                    yield results.pop(next(iter(results)))
+            submit()
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def run_parallel(calls: Iterable[Tuple[Hashable, Callable[[], object]]], max_workers: int = 8,
+                 timeout: Optional[float] = None) -> Dict[Hashable, CallResult]:
+    """iter_parallel с результатами по ключам"""
+    return {result.key: result for result in iter_parallel(calls, max_workers, timeout)}
+
+
+async def aiter_parallel(calls: Iterable[Tuple[Hashable, Callable[[], Awaitable]]], max_workers: int = 8,
+                         timeout: Optional[float] = None, ordered: bool = False) -> AsyncIterator[CallResult]:
+    """iter_parallel для корутин: те же ленивое чтение calls и ограничение max_workers"""
+    calls = iter(calls)
+    max_workers = max(1, max_workers)
+    tasks: Dict[asyncio.Task, int] = {}
+    results: Dict[int, CallResult] = {}
+    submitted = 0
+    next_index = 0
+    exhausted = False
+
+    async def run(key: Hashable, func: Callable[[], Awaitable]) -> CallResult:
+        start = perf_counter()
+        try:
+            if timeout is None:
+                value = await func()
+            else:
+                value = await asyncio.wait_for(func(), timeout)
+        except asyncio.TimeoutError:
+            return CallResult(key, error=_timeout_error(key, timeout), elapsed=perf_counter() - start)
+        except Exception as err:
+            return CallResult(key, error=err, elapsed=perf_counter() - start)
+        return _result(key, value, perf_counter() - start)
+
+    def submit():
+        nonlocal submitted, exhausted
+        while not exhausted and len(tasks) + len(results) < max_workers:
+            try:
+                key, func = next(calls)
+            except StopIteration:
+                exhausted = True
+                return
+            tasks[asyncio.ensure_future(run(key, func))] = submitted
+            submitted += 1
+
+    def collect(done: Iterable[asyncio.Task]):
+        for task in done:
+            results[tasks.pop(task)] = task.result()
+
+    try:
+        submit()
+        while tasks:
+            collect((await asyncio.wait(list(tasks), return_when=asyncio.FIRST_COMPLETED))[0])
+            if ordered:
+                while next_index in results:
+                    next_index += 1
+                    yield results.pop(next_index - 1)
+            else:
+                while results:
+                    yield results.pop(next(iter(results)))
+            submit()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def run_parallel_async(calls: Iterable[Tuple[Hashable, Callable[[], Awaitable]]], max_workers: int = 8,
+                             timeout: Optional[float] = None) -> Dict[Hashable, CallResult]:
+    return {result.key: result async for result in aiter_parallel(calls, max_workers, timeout)}
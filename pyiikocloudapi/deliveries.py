@@ -0,0 +1,881 @@
+import asyncio
+import bisect
+import hashlib
+import inspect
+import json
+import os
+import queue
+import threading
+import warnings
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from time import monotonic
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from pyiikocloudapi.cache import CacheStats, FRESH, ResponseCache
+from pyiikocloudapi.exception import PostException
+from pyiikocloudapi.models import ByDeliveryDateAndPhoneModel, CustomErrorModel, OrderRetrieveModel
+from pyiikocloudapi.parsing import PARSE_FULL, parsing
+
+
+def revision_key(organization_ids: List[str]) -> str:
+    """Ключ ревизии набора организаций (не зависит от порядка id)"""
+    return hashlib.sha256("|".join(sorted(organization_ids)).encode()).hexdigest()
+
+
+class RevisionStore(ABC):
+    """Хранилище последней обработанной ревизии заказов по набору организаций (revision_key)"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, revision: int):
+        pass
+
+
+class MemoryRevisionStore(RevisionStore):
+    """Хранилище в памяти процесса"""
+
+    def __init__(self):
+        self.__revisions: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[int]:
+        return self.__revisions.get(key)
+
+    def set(self, key: str, revision: int):
+        self.__revisions[key] = revision
+
+
+class FileRevisionStore(RevisionStore):
+    """Хранилище в JSON файле, ревизия переживает перезапуск процесса"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "rb") as file:
+                return json.loads(file.read() or b"{}")
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[int]:
+        return self._read().get(key)
+
+    def set(self, key: str, revision: int):
+        with self.__lock:
+            data = self._read()
+            data[key] = revision
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as file:
+                json.dump(data, file)
+            os.replace(tmp, self.path)
+
+
+class DeliveryChangeFeed:
+    """
+    Лента изменений заказов доставки на /api/1/deliveries/by_revision: каждый запрос передаёт последнюю
+    сохранённую ревизию и получает только изменённые с неё заказы, после обработки сохраняется max_revision.
+
+        feed = DeliveryChangeFeed(api, organization_ids, FileRevisionStore("/var/lib/app/revisions.json"))
+        for order in feed.changes(interval=5):
+            handle(order)
+
+    Для AsyncIikoTransport - await feed.poll_async() и async for order in feed.changes_async().
+    """
+
+    def __init__(self, api, organization_ids: List[str], store: Optional[RevisionStore] = None,
+                 start_revision: int = 0, source_keys: Optional[list] = None):
+        """
+        :param api: IikoTransport or AsyncIikoTransport
+        :param organization_ids: Organizations IDs
+        :param store: revision store, MemoryRevisionStore by default
+        :param start_revision: revision of the first request if the store has no revision for organization_ids
+        :param source_keys: Source keys
+        """
+        self.api = api
+        self.organization_ids = list(organization_ids)
+        self.store = store if store is not None else MemoryRevisionStore()
+        self.key = revision_key(self.organization_ids)
+        self.start_revision = start_revision
+        self.source_keys = source_keys
+        self.last_revision: Optional[int] = None
+
+    @property
+    def revision(self) -> int:
+        """Ревизия, с которой будет запрошен следующий набор изменений"""
+        revision = self.store.get(self.key)
+        return self.start_revision if revision is None else revision
+
+    def commit(self, revision: int):
+        """Сохранить ревизию (при poll(commit=False) - после обработки заказов)"""
+        self.store.set(self.key, revision)
+
+    def _changes(self, result, commit: bool) -> Union[List[OrderRetrieveModel], CustomErrorModel]:
+        if isinstance(result, CustomErrorModel):
+            return result
+        orders = [order for organization in result.orders_by_organizations or ()
+                  for order in organization.orders or ()]
+        self.last_revision = result.max_revision
+        if commit:
+            self.commit(result.max_revision)
+        return orders
+
+    def poll(self, commit: bool = True) -> Union[List[OrderRetrieveModel], CustomErrorModel]:
+        """
+        Один запрос изменений
+        :param commit: save max_revision right away (False - call commit(feed.last_revision) after processing,
+        then orders are not lost if processing fails)
+        :return: changed orders or CustomErrorModel
+        """
+        with parsing(PARSE_FULL):
+            result = self.api.by_revision(self.organization_ids, self.revision, self.source_keys)
+        return self._changes(result, commit)
+
+    async def poll_async(self, commit: bool = True) -> Union[List[OrderRetrieveModel], CustomErrorModel]:
+        with parsing(PARSE_FULL):
+            result = await self.api.by_revision(self.organization_ids, self.revision, self.source_keys)
+        return self._changes(result, commit)
+
+    def changes(self, interval: float = 5.0, stop: Optional[threading.Event] = None) -> Iterator[OrderRetrieveModel]:
+        """
+        Бесконечный итератор изменённых заказов: ревизия сохраняется после того, как отданы все заказы запроса
+        :param interval: pause between requests, seconds
+        :param stop: event to stop the iteration
+        """
+        stop = stop if stop is not None else threading.Event()
+        while not stop.is_set():
+            orders = self.poll(commit=False)
+            if isinstance(orders, CustomErrorModel):
+                stop.wait(interval)
+                continue
+            yield from orders
+            self.commit(self.last_revision)
+            if not orders:
+                stop.wait(interval)
+
+    async def changes_async(self, interval: float = 5.0,
+                            stop: Optional[asyncio.Event] = None) -> AsyncIterator[OrderRetrieveModel]:
+        stop = stop if stop is not None else asyncio.Event()
+        while not stop.is_set():
+            orders = await self.poll_async(commit=False)
+            if not isinstance(orders, CustomErrorModel):
+                for order in orders:
+                    yield order
+                self.commit(self.last_revision)
+                if orders:
+                    continue
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+ORDER_CREATED = "created"
+ORDER_CHANGED = "changed"
+STATUS_CHANGED = "status_changed"
+COURIER_ASSIGNED = "courier_assigned"
+PROBLEM_FLAGGED = "problem_flagged"
+ORDER_EVENTS = (ORDER_CREATED, ORDER_CHANGED, STATUS_CHANGED, COURIER_ASSIGNED, PROBLEM_FLAGGED)
+
+FINAL_STATUSES = frozenset({"Closed", "Cancelled"})
+
+
+class OrderEvent:
+    """
+    Изменение заказа доставки, передаётся подписчикам DeliverySubscriber.
+
+    kind - тип события (ORDER_EVENTS)
+    order - заказ после изменения, previous - предыдущее известное состояние (None для ORDER_CREATED)
+    """
+    __slots__ = ("kind", "order", "previous")
+
+    def __init__(self, kind: str, order: OrderRetrieveModel, previous: Optional[OrderRetrieveModel] = None):
+        self.kind = kind
+        self.order = order
+        self.previous = previous
+
+    @property
+    def order_id(self) -> str:
+        return self.order.id
+
+    def __repr__(self):
+        return f"<OrderEvent {self.kind} order={self.order.id}>"
+
+
+def _status(order: Optional[OrderRetrieveModel]) -> Optional[str]:
+    return order.order.status if order is not None and order.order is not None else None
+
+
+def _courier_id(order: Optional[OrderRetrieveModel]) -> Optional[str]:
+    if order is None or order.order is None or order.order.courier_info is None:
+        return None
+    return order.order.courier_info.courier.id
+
+
+def _has_problem(order: Optional[OrderRetrieveModel]) -> bool:
+    return order is not None and order.order is not None and order.order.problem is not None and \
+        order.order.problem.has_problem
+
+
+def _is_final(order: OrderRetrieveModel) -> bool:
+    """Заказ закрыт, отменён или удалён - больше не изменится"""
+    return _status(order) in FINAL_STATUSES or (order.order is not None and bool(order.order.is_deleted))
+
+
+def diff_order(previous: Optional[OrderRetrieveModel], order: OrderRetrieveModel) -> List[OrderEvent]:
+    """События изменения заказа относительно предыдущего состояния (previous=None - новый заказ)"""
+    events = [OrderEvent(ORDER_CREATED if previous is None else ORDER_CHANGED, order, previous)]
+    if previous is not None and _status(previous) != _status(order):
+        events.append(OrderEvent(STATUS_CHANGED, order, previous))
+    courier_id = _courier_id(order)
+    if courier_id is not None and courier_id != _courier_id(previous):
+        events.append(OrderEvent(COURIER_ASSIGNED, order, previous))
+    if _has_problem(order) and not _has_problem(previous):
+        events.append(OrderEvent(PROBLEM_FLAGGED, order, previous))
+    return events
+
+
+class AdaptiveInterval:
+    """
+    Интервал опроса: после запроса с изменениями - min_interval (пачка изменений выбирается без пауз),
+    после пустого запроса или ошибки интервал растёт в factor раз до max_interval
+    """
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 30.0, factor: float = 2.0):
+        if min_interval <= 0 or max_interval < min_interval or factor < 1:
+            raise ValueError("Должно быть 0 < min_interval <= max_interval и factor >= 1")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.current = min_interval
+
+    def next(self, changes: int) -> float:
+        """Пауза перед следующим запросом, changes - число изменённых заказов в последнем запросе"""
+        if changes:
+            self.current = self.min_interval
+            return 0.0
+        delay = self.current
+        self.current = min(self.current * self.factor, self.max_interval)
+        return delay
+
+
+class DeliverySubscriber:
+    """
+    Фоновая подписка на изменения заказов доставки поверх DeliveryChangeFeed: опрос by_revision с адаптивным
+    интервалом, сравнение заказа с предыдущим состоянием и вызов подписчиков событий (OrderEvent) в пуле
+    из workers обработчиков. События одного заказа обрабатываются одним обработчиком по порядку. Очереди
+    обработчиков ограничены queue_size: если подписчики не успевают, опрос ждёт освобождения очереди.
+    Ревизия сохраняется после обработки всех событий запроса.
+
+        subscriber = DeliverySubscriber(api, organization_ids)
+
+        @subscriber.on_status_changed
+        def status_changed(event: OrderEvent):
+            ...
+
+        subscriber.start()
+        ...
+        subscriber.stop()
+
+    Для AsyncIikoTransport - await subscriber.run_async(stop), подписчики могут быть корутинами.
+    """
+
+    def __init__(self, api, organization_ids: List[str], store: Optional[RevisionStore] = None,
+                 start_revision: int = 0, source_keys: Optional[list] = None, workers: int = 4,
+                 queue_size: int = 100, min_interval: float = 1.0, max_interval: float = 30.0):
+        """
+        :param api: IikoTransport or AsyncIikoTransport
+        :param organization_ids: Organizations IDs
+        :param store: revision store, MemoryRevisionStore by default
+        :param start_revision: revision of the first request if the store has no revision for organization_ids
+        :param source_keys: Source keys
+        :param workers: number of event handlers
+        :param queue_size: maximum number of pending orders per handler
+        :param min_interval: pause between requests while orders are changing, seconds
+        :param max_interval: maximum pause between requests without changes, seconds
+        """
+        if workers < 1 or queue_size < 1:
+            raise ValueError("workers и queue_size должны быть больше 0")
+        self.feed = DeliveryChangeFeed(api, organization_ids, store, start_revision, source_keys)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.interval = AdaptiveInterval(min_interval, max_interval)
+        self.callbacks: Dict[str, List[Callable[[OrderEvent], object]]] = {kind: [] for kind in ORDER_EVENTS}
+        self.errors: List[Callable[[BaseException], None]] = []
+        self.orders: Dict[str, OrderRetrieveModel] = {}
+        self.__stop = threading.Event()
+        self.__threads: List[threading.Thread] = []
+
+    def on(self, kind: str, callback: Callable[[OrderEvent], object]):
+        if kind not in self.callbacks:
+            raise ValueError(f"Неизвестное событие {kind!r}, доступны {ORDER_EVENTS}")
+        self.callbacks[kind].append(callback)
+        return callback
+
+    def on_created(self, callback: Callable[[OrderEvent], object]):
+        """Новый заказ"""
+        return self.on(ORDER_CREATED, callback)
+
+    def on_changed(self, callback: Callable[[OrderEvent], object]):
+        """Любое изменение известного заказа"""
+        return self.on(ORDER_CHANGED, callback)
+
+    def on_status_changed(self, callback: Callable[[OrderEvent], object]):
+        return self.on(STATUS_CHANGED, callback)
+
+    def on_courier_assigned(self, callback: Callable[[OrderEvent], object]):
+        """Назначен или сменён курьер"""
+        return self.on(COURIER_ASSIGNED, callback)
+
+    def on_problem_flagged(self, callback: Callable[[OrderEvent], object]):
+        """У заказа появилась проблема (problem.hasProblem)"""
+        return self.on(PROBLEM_FLAGGED, callback)
+
+    def on_error(self, callback: Callable[[BaseException], None]):
+        """Ошибка запроса изменений или подписчика (без подписки - RuntimeWarning)"""
+        self.errors.append(callback)
+        return callback
+
+    def _error(self, error: BaseException):
+        if not self.errors:
+            warnings.warn(f"Ошибка подписки на заказы: {error!r}", RuntimeWarning, stacklevel=2)
+        for callback in self.errors:
+            try:
+                callback(error)
+            except Exception as err:
+                warnings.warn(f"Ошибка в обработчике ошибок {callback!r}: {err!r}", RuntimeWarning, stacklevel=2)
+
+    def _events(self, order: OrderRetrieveModel) -> List[OrderEvent]:
+        previous = self.orders.get(order.id)
+        if previous is not None and previous.timestamp > order.timestamp:
+            return []
+        events = diff_order(previous, order)
+        if _is_final(order):
+            self.orders.pop(order.id, None)
+        else:
+            self.orders[order.id] = order
+        return [event for event in events if self.callbacks[event.kind]]
+
+    def _worker_index(self, order_id: str) -> int:
+        return hash(order_id) % self.workers
+
+    def _poll_error(self, orders) -> bool:
+        if isinstance(orders, CustomErrorModel):
+            self._error(PostException(self.__class__.__qualname__, "poll", orders.error_description))
+            return True
+        return False
+
+    # sync
+
+    def _dispatch(self, events: List[OrderEvent]):
+        for event in events:
+            for callback in self.callbacks[event.kind]:
+                try:
+                    callback(event)
+                except Exception as err:
+                    self._error(err)
+
+    def _work(self, tasks: "queue.Queue"):
+        while True:
+            events = tasks.get()
+            try:
+                if events is None:
+                    return
+                self._dispatch(events)
+            finally:
+                tasks.task_done()
+
+    def poll_once(self, queues: Optional[List["queue.Queue"]] = None) -> int:
+        """
+        Один запрос изменений: события отправляются в очереди обработчиков (без очередей - вызываются сразу),
+        после их обработки сохраняется ревизия
+        :return: number of changed orders, -1 on error
+        """
+        try:
+            orders = self.feed.poll(commit=False)
+        except Exception as err:
+            self._error(err)
+            return -1
+        if self._poll_error(orders):
+            return -1
+        for order in orders:
+            events = self._events(order)
+            if not events:
+                continue
+            if queues is None:
+                self._dispatch(events)
+            else:
+                queues[self._worker_index(order.id)].put(events)
+        if queues is not None:
+            for tasks in queues:
+                tasks.join()
+        self.feed.commit(self.feed.last_revision)
+        return len(orders)
+
+    def run(self, stop: Optional[threading.Event] = None):
+        """Опрашивать изменения до stop (по умолчанию - до stop()) в текущем потоке"""
+        stop = stop if stop is not None else self.__stop
+        queues = [queue.Queue(self.queue_size) for _ in range(self.workers)]
+        threads = [threading.Thread(target=self._work, args=(tasks,), name=f"iiko-deliveries-{index}", daemon=True)
+                   for index, tasks in enumerate(queues)]
+        for thread in threads:
+            thread.start()
+        try:
+            while not stop.is_set():
+                changes = self.poll_once(queues)
+                stop.wait(self.interval.next(max(changes, 0)))
+        finally:
+            for tasks in queues:
+                tasks.put(None)
+            for thread in threads:
+                thread.join()
+
+    def start(self) -> "DeliverySubscriber":
+        """Запустить run() в фоновом потоке"""
+        if self.running:
+            raise RuntimeError("Подписка уже запущена")
+        self.__stop.clear()
+        thread = threading.Thread(target=self.run, name="iiko-deliveries", daemon=True)
+        thread.start()
+        self.__threads = [thread]
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """Остановить фоновый опрос и дождаться обработки начатого запроса"""
+        self.__stop.set()
+        for thread in self.__threads:
+            thread.join(timeout)
+        self.__threads = [thread for thread in self.__threads if thread.is_alive()]
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self.__threads)
+
+    # async
+
+    async def _dispatch_async(self, events: List[OrderEvent]):
+        for event in events:
+            for callback in self.callbacks[event.kind]:
+                try:
+                    result = callback(event)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as err:
+                    self._error(err)
+
+    async def _work_async(self, tasks: asyncio.Queue):
+        while True:
+            events = await tasks.get()
+            try:
+                if events is None:
+                    return
+                await self._dispatch_async(events)
+            finally:
+                tasks.task_done()
+
+    async def poll_once_async(self, queues: Optional[List[asyncio.Queue]] = None) -> int:
+        try:
+            orders = await self.feed.poll_async(commit=False)
+        except Exception as err:
+            self._error(err)
+            return -1
+        if self._poll_error(orders):
+            return -1
+        for order in orders:
+            events = self._events(order)
+            if not events:
+                continue
+            if queues is None:
+                await self._dispatch_async(events)
+            else:
+                await queues[self._worker_index(order.id)].put(events)
+        if queues is not None:
+            for tasks in queues:
+                await tasks.join()
+        self.feed.commit(self.feed.last_revision)
+        return len(orders)
+
+    async def run_async(self, stop: Optional[asyncio.Event] = None):
+        """Опрашивать изменения до stop в текущем event loop (отмена задачи тоже останавливает опрос)"""
+        stop = stop if stop is not None else asyncio.Event()
+        queues = [asyncio.Queue(self.queue_size) for _ in range(self.workers)]
+        workers = [asyncio.ensure_future(self._work_async(tasks)) for tasks in queues]
+        try:
+            while not stop.is_set():
+                delay = self.interval.next(max(await self.poll_once_async(queues), 0))
+                if not delay:
+                    continue
+                try:
+                    await asyncio.wait_for(stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+
+def _time_key(value: Union[str, datetime, None]) -> Optional[str]:
+    """Время в формате iiko (yyyy-MM-dd HH:mm:ss.fff), строки этого формата сравниваются как время"""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
+    return value
+
+
+class DeliveryOrderStore:
+    """
+    Заказы доставки в памяти: основное хранилище по id и индексы по статусу, курьеру, телефону, группе терминалов,
+    внешнему номеру, номеру и часу completeBefore. Индексы обновляются при каждом изменении заказа, поиск - по
+    индексу без перебора ordersByOrganizations (время - bisect по отсортированным часам).
+
+        store = DeliveryOrderStore()
+        store.load(api.by_delivery_date_and_status(organization_ids, date_from, date_to))
+        store.attach(subscriber)
+        store.by_courier(courier_id, status="OnWay")
+        store.complete_before_between("2026-10-18 12:00:00.000", "2026-10-18 14:00:00.000")
+
+    Закрытые, отменённые и удалённые заказы хранятся ещё final_ttl секунд, затем удаляются из хранилища
+    и индексов (проверка при каждом обновлении и в evict()), поэтому память долгой подписки не растёт.
+    """
+
+    INDEXES = ("status", "courier", "phone", "terminal_group", "external_number", "number", "complete_before")
+
+    def __init__(self, country_code: str = "7", final_ttl: Optional[float] = 3600.0):
+        """
+        :param country_code: country code for phone numbers without "+" (phones are indexed in E.164)
+        :param final_ttl: how long orders in a final status (Closed, Cancelled, deleted) are kept, seconds;
+        0 - removed right away, None - kept until remove()/clear()
+        """
+        self.country_code = country_code
+        self.final_ttl = final_ttl
+        self.__orders: Dict[str, OrderRetrieveModel] = {}
+        # id заказов в финальном статусе -> время удаления, в порядке удаления (final_ttl один для всех)
+        self.__finished: "OrderedDict[str, float]" = OrderedDict()
+        self.__indexes: Dict[str, Dict[object, Set[str]]] = {name: {} for name in self.INDEXES}
+        self.__hours: List[str] = []
+        self.__lock = threading.RLock()
+
+    def _phone(self, phone: Optional[str]) -> Optional[str]:
+        if not phone:
+            return None
+        try:
+            return normalize_phone(phone, self.country_code)
+        except ValueError:
+            return phone
+
+    def _keys(self, order: OrderRetrieveModel) -> Dict[str, object]:
+        delivery = order.order
+        keys = {"external_number": order.external_number}
+        if delivery is not None:
+            keys.update(status=delivery.status, courier=_courier_id(order), phone=self._phone(delivery.phone),
+                        terminal_group=delivery.terminal_group_id, number=delivery.number,
+                        complete_before=delivery.complete_before[:13] if delivery.complete_before else None)
+        return keys
+
+    def _index(self, order: OrderRetrieveModel):
+        for name, key in self._keys(order).items():
+            if key is None:
+                continue
+            ids = self.__indexes[name].get(key)
+            if ids is None:
+                ids = self.__indexes[name][key] = set()
+                if name == "complete_before":
+                    bisect.insort(self.__hours, key)
+            ids.add(order.id)
+
+    def _unindex(self, order: OrderRetrieveModel):
+        for name, key in self._keys(order).items():
+            ids = self.__indexes[name].get(key)
+            if ids is None:
+                continue
+            ids.discard(order.id)
+            if not ids:
+                del self.__indexes[name][key]
+                if name == "complete_before":
+                    del self.__hours[bisect.bisect_left(self.__hours, key)]
+
+    def update(self, order: OrderRetrieveModel) -> bool:
+        """Добавить или обновить заказ, False - в хранилище уже более новая версия (timestamp)"""
+        with self.__lock:
+            now = monotonic()
+            self._evict(now)
+            previous = self.__orders.get(order.id)
+            if previous is not None:
+                if previous.timestamp > order.timestamp:
+                    return False
+                self._unindex(previous)
+            if self.final_ttl is not None and _is_final(order):
+                if self.final_ttl <= 0:
+                    self.__orders.pop(order.id, None)
+                    self.__finished.pop(order.id, None)
+                    return True
+                self.__finished[order.id] = now + self.final_ttl
+                self.__finished.move_to_end(order.id)
+            else:
+                self.__finished.pop(order.id, None)
+            self.__orders[order.id] = order
+            self._index(order)
+            return True
+
+    def _evict(self, now: float) -> int:
+        evicted = 0
+        while self.__finished:
+            order_id, expires = next(iter(self.__finished.items()))
+            if expires > now:
+                break
+            del self.__finished[order_id]
+            order = self.__orders.pop(order_id, None)
+            if order is not None:
+                self._unindex(order)
+                evicted += 1
+        return evicted
+
+    def evict(self) -> int:
+        """Удалить заказы, которые находятся в финальном статусе дольше final_ttl
+        :return: number of removed orders"""
+        with self.__lock:
+            return self._evict(monotonic())
+
+    def update_many(self, orders: Iterable[OrderRetrieveModel]) -> int:
+        """:return: number of updated orders"""
+        with self.__lock:
+            return sum(self.update(order) for order in orders)
+
+    def load(self, response) -> int:
+        """Заказы ответа by_delivery_date_and_status, by_revision и других с ordersByOrganizations"""
+        return self.update_many(order for organization in response.orders_by_organizations or ()
+                                for order in organization.orders or ())
+
+    def remove(self, order_id: str) -> Optional[OrderRetrieveModel]:
+        with self.__lock:
+            order = self.__orders.pop(order_id, None)
+            self.__finished.pop(order_id, None)
+            if order is not None:
+                self._unindex(order)
+            return order
+
+    def attach(self, subscriber: "DeliverySubscriber") -> "DeliveryOrderStore":
+        """Обновлять хранилище событиями DeliverySubscriber (новые и изменённые заказы)"""
+        callback = self._on_event
+        subscriber.on_created(callback)
+        subscriber.on_changed(callback)
+        return self
+
+    def _on_event(self, event: OrderEvent):
+        self.update(event.order)
+
+    def clear(self):
+        with self.__lock:
+            self.__orders.clear()
+            self.__finished.clear()
+            for index in self.__indexes.values():
+                index.clear()
+            self.__hours.clear()
+
+    def get(self, order_id: str) -> Optional[OrderRetrieveModel]:
+        return self.__orders.get(order_id)
+
+    def _find(self, name: str, key) -> List[OrderRetrieveModel]:
+        with self.__lock:
+            return [self.__orders[order_id] for order_id in self.__indexes[name].get(key, ())]
+
+    def by_status(self, status: str) -> List[OrderRetrieveModel]:
+        return self._find("status", status)
+
+    def by_courier(self, courier_id: str, status: Optional[str] = None) -> List[OrderRetrieveModel]:
+        """Заказы курьера, status - только в этом статусе (пересечение индексов)"""
+        if status is None:
+            return self._find("courier", courier_id)
+        with self.__lock:
+            ids = self.__indexes["courier"].get(courier_id, set()) & self.__indexes["status"].get(status, set())
+            return [self.__orders[order_id] for order_id in ids]
+
+    def by_phone(self, phone: str) -> List[OrderRetrieveModel]:
+        """Номер в любом формате, сравнение в E.164"""
+        return self._find("phone", self._phone(phone))
+
+    def by_terminal_group(self, terminal_group_id: str) -> List[OrderRetrieveModel]:
+        return self._find("terminal_group", terminal_group_id)
+
+    def by_external_number(self, external_number: str) -> List[OrderRetrieveModel]:
+        return self._find("external_number", external_number)
+
+    def by_number(self, number: int) -> List[OrderRetrieveModel]:
+        """Номер заказа уникален в организации, для нескольких организаций заказов может быть больше одного"""
+        return self._find("number", number)
+
+    def complete_before_between(self, start: Union[str, datetime],
+                                end: Union[str, datetime]) -> List[OrderRetrieveModel]:
+        """Заказы с completeBefore в [start, end), отсортированные по completeBefore"""
+        start, end = _time_key(start), _time_key(end)
+        with self.__lock:
+            hours = self.__hours[bisect.bisect_left(self.__hours, start[:13]):bisect.bisect_left(self.__hours, end)]
+            index = self.__indexes["complete_before"]
+            orders = [self.__orders[order_id] for hour in hours for order_id in index[hour]]
+        orders = [order for order in orders if start <= order.order.complete_before < end]
+        orders.sort(key=lambda order: order.order.complete_before)
+        return orders
+
+    def statuses(self) -> Dict[str, int]:
+        """Число заказов по статусам"""
+        with self.__lock:
+            return {status: len(ids) for status, ids in self.__indexes["status"].items()}
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self.__orders
+
+    def __iter__(self) -> Iterator[OrderRetrieveModel]:
+        with self.__lock:
+            return iter(list(self.__orders.values()))
+
+    def __len__(self):
+        return len(self.__orders)
+
+
+def normalize_phone(phone: str, country_code: str = "7") -> str:
+    """
+    Номер телефона в E.164: "+7 (999) 000-00-00", "89990000000", "9990000000" -> "+79990000000".
+    Для номеров без "+" 8 в начале заменяется на country_code (если он 7), к 10 цифрам добавляется country_code.
+    """
+    digits = "".join(char for char in phone if char.isdigit())
+    if not phone.strip().startswith("+"):
+        if country_code == "7" and len(digits) == 11 and digits.startswith("8"):
+            digits = "7" + digits[1:]
+        elif len(digits) == 10:
+            digits = country_code + digits
+    if not 8 <= len(digits) <= 15:
+        raise ValueError(f"Некорректный номер телефона: {phone!r}")
+    return "+" + digits
+
+
+class PhoneLookupCache:
+    """
+    Короткий кэш by_delivery_date_and_phone для поиска заказов звонящего: ключ - номер в E.164 (normalize_phone),
+    организации, даты и sourceKeys. Одновременные запросы с одним ключом (несколько операторов открыли одного
+    клиента) ждут один запрос к iiko. Хранение - ResponseCache без устаревших ответов, кэшируются только успешные.
+
+        lookup = PhoneLookupCache(api, ttl=15)
+        orders = lookup.orders(organization_ids, "8 (999) 000-00-00", delivery_date_from)
+    """
+
+    URL = "/api/1/deliveries/by_delivery_date_and_phone"
+
+    def __init__(self, api, ttl: float = 15.0, maxsize: int = 1024, country_code: str = "7"):
+        """
+        :param api: IikoTransport or AsyncIikoTransport
+        :param ttl: how long a response is reused, seconds
+        :param maxsize: maximum number of cached responses
+        :param country_code: country code for numbers without "+"
+        """
+        self.api = api
+        self.country_code = country_code
+        self.cache = ResponseCache({self.URL: ttl}, maxsize=maxsize, stale_ttl=0.0)
+        self.coalesced = 0
+        self.__inflight: Dict[Hashable, Future] = {}
+        self.__tasks: Dict[Hashable, asyncio.Future] = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.cache.stats
+
+    def _request(self, organization_ids: List[str], phone: str, delivery_date_from, delivery_date_to,
+                 source_keys: Optional[list]) -> Tuple[Hashable, dict]:
+        phone = normalize_phone(phone, self.country_code)
+        kwargs = dict(organization_id=sorted(organization_ids), phone=phone, delivery_date_from=delivery_date_from,
+                      delivery_date_to=delivery_date_to, source_keys=source_keys)
+        data = {"organizationIds": organization_ids, "phone": phone, "from": _time_key(delivery_date_from),
+                "to": _time_key(delivery_date_to), "sourceKeys": sorted(source_keys or ())}
+        return self.cache.key(self.URL, data, PARSE_FULL, self.api.model_backend), kwargs
+
+    def _fresh(self, key: Hashable):
+        value, state = self.cache.get(key)
+        return value if state == FRESH else None
+
+    def _store(self, key: Hashable, value):
+        if not isinstance(value, CustomErrorModel):
+            self.cache.set(key, value)
+
+    def lookup(self, organization_ids: List[str], phone: str, delivery_date_from: Union[datetime, str] = None,
+               delivery_date_to: Union[datetime, str] = None,
+               source_keys: Optional[list] = None) -> Union[ByDeliveryDateAndPhoneModel, CustomErrorModel]:
+        """by_delivery_date_and_phone через кэш"""
+        key, kwargs = self._request(organization_ids, phone, delivery_date_from, delivery_date_to, source_keys)
+        with self.__lock:
+            value = self._fresh(key)
+            if value is not None:
+                return value
+            future = self.__inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.__inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            with parsing(PARSE_FULL):
+                value = self.api.by_delivery_date_and_phone(**kwargs)
+            self._store(key, value)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self.__lock:
+                self.__inflight.pop(key, None)
+        return value
+
+    async def _lookup_async(self, key: Hashable, kwargs: dict):
+        try:
+            with parsing(PARSE_FULL):
+                value = await self.api.by_delivery_date_and_phone(**kwargs)
+            self._store(key, value)
+            return value
+        finally:
+            self.__tasks.pop(key, None)
+
+    async def lookup_async(self, organization_ids: List[str], phone: str,
+                           delivery_date_from: Union[datetime, str] = None,
+                           delivery_date_to: Union[datetime, str] = None,
+                           source_keys: Optional[list] = None) -> Union[ByDeliveryDateAndPhoneModel, CustomErrorModel]:
+        key, kwargs = self._request(organization_ids, phone, delivery_date_from, delivery_date_to, source_keys)
+        value = self._fresh(key)
+        if value is not None:
+            return value
+        task = self.__tasks.get(key)
+        if task is None:
+            task = self.__tasks[key] = asyncio.ensure_future(self._lookup_async(key, kwargs))
+        else:
+            self.coalesced += 1
+        # shield - отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _orders(response) -> Union[List[OrderRetrieveModel], CustomErrorModel]:
+        if isinstance(response, CustomErrorModel):
+            return response
+        return [order for organization in response.orders_by_organizations or ()
+                for order in organization.orders or ()]
+
+    def orders(self, organization_ids: List[str], phone: str, delivery_date_from: Union[datetime, str] = None,
+               delivery_date_to: Union[datetime, str] = None,
+               source_keys: Optional[list] = None) -> Union[List[OrderRetrieveModel], CustomErrorModel]:
+        """Заказы звонящего списком"""
+        return self._orders(self.lookup(organization_ids, phone, delivery_date_from, delivery_date_to, source_keys))
+
+    async def orders_async(self, organization_ids: List[str], phone: str,
+                           delivery_date_from: Union[datetime, str] = None,
+                           delivery_date_to: Union[datetime, str] = None,
+                           source_keys: Optional[list] = None) -> Union[List[OrderRetrieveModel], CustomErrorModel]:
+        return self._orders(await self.lookup_async(organization_ids, phone, delivery_date_from, delivery_date_to,
+                                                    source_keys))
+
+    def invalidate(self):
+        self.cache.invalidate(self.URL)
@@ -40,4 +40,14 @@ class CheckTimeToken(CloudException):
 class ParamSetException(CloudException):
     """"""
     def __init__(self, name_class, name_method, message):
-        super().__init__(f"Class: \"{name_class}\", Method: \"{name_method}\", Message: {message}")
\ No newline at end of file
+        super().__init__(f"Class: \"{name_class}\", Method: \"{name_method}\", Message: {message}")
+
+
+class TransportException(TokenException, PostException):
+    """
+    Network or HTTP client error of a request, raised by both clients (requests and httpx).
+    Subclasses TokenException and PostException, which the methods raised for these errors before.
+    """
+
+    def __init__(self, name_class, name_method, message):
+        CloudException.__init__(self, f"Class: \"{name_class}\", Method: \"{name_method}\", Message: {message}")
@@ -0,0 +1,97 @@
+import warnings
+from typing import Callable, List, Optional
+
+
+class HookEvent:
+    """
+    Событие запроса к iiko Cloud API, передаётся подписчикам хуков.
+
+    endpoint - url метода (/api/1/nomenclature)
+    status - HTTP статус ответа, None если ответ не получен
+    request_size, response_size - размер тела запроса и ответа в байтах
+    elapsed - время сетевого запроса в секундах
+    parse_elapsed - время разбора ответа в модель (parse_obj) в секундах
+    correlation_id - correlationId из ответа
+    error - исключение (для on_error), если ответ не получен или не разобран в модель
+    Тела запроса и ответа декодируются в строку только при вызове request_text()/response_text().
+    """
+    __slots__ = ("endpoint", "status", "request_size", "response_size", "elapsed", "correlation_id", "error",
+                 "parse_elapsed", "_request_body", "_response_body")
+
+    def __init__(self, endpoint: str, request_body: bytes = b"", status: Optional[int] = None,
+                 response_body: Optional[bytes] = None, elapsed: float = 0.0, correlation_id: Optional[str] = None,
+                 error: Optional[BaseException] = None, parse_elapsed: float = 0.0):
+        self.endpoint = endpoint
+        self.status = status
+        self.request_size = len(request_body)
+        self.response_size = len(response_body) if response_body is not None else 0
+        self.elapsed = elapsed
+        self.correlation_id = correlation_id
+        self.error = error
+        self.parse_elapsed = parse_elapsed
+        self._request_body = request_body
+        self._response_body = response_body
+
+    def request_text(self) -> str:
+        return self._request_body.decode("utf-8", errors="replace")
+
+    def response_text(self) -> str:
+        if self._response_body is None:
+            return ""
+        return self._response_body.decode("utf-8", errors="replace")
+
+    def __repr__(self):
+        return f"<HookEvent {self.endpoint} status={self.status} elapsed={self.elapsed:.3f}s " \
+               f"parse={self.parse_elapsed:.3f}s " \
+               f"request={self.request_size}B response={self.response_size}B correlation_id={self.correlation_id}>"
+
+
+class Hooks:
+    """
+    Подписки на события запросов. Пока никто не подписан, события не создаются.
+
+        api.hooks.on_response(lambda event: print(event))
+
+        @api.hooks.on_error
+        def log_error(event: HookEvent):
+            ...
+    """
+
+    def __init__(self):
+        self.request: List[Callable[[HookEvent], None]] = []
+        self.response: List[Callable[[HookEvent], None]] = []
+        self.error: List[Callable[[HookEvent], None]] = []
+
+    def on_request(self, callback: Callable[[HookEvent], None]):
+        """Перед отправкой запроса"""
+        self.request.append(callback)
+        return callback
+
+    def on_response(self, callback: Callable[[HookEvent], None]):
+        """После успешного ответа"""
+        self.response.append(callback)
+        return callback
+
+    def on_error(self, callback: Callable[[HookEvent], None]):
+        """Ответ с errorDescription или исключение при запросе"""
+        self.error.append(callback)
+        return callback
+
+    def remove(self, callback: Callable[[HookEvent], None]):
+        """Отписать callback от всех событий"""
+        for callbacks in (self.request, self.response, self.error):
+            while callback in callbacks:
+                callbacks.remove(callback)
+
+    @staticmethod
+    def emit(callbacks: List[Callable[[HookEvent], None]], event: HookEvent):
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as err:
+                warnings.warn(f"Ошибка в хуке {callback!r}: {err!r}", RuntimeWarning, stacklevel=2)
+
+
+def print_hook(event: HookEvent):
+    """Хук для debug режима: печать запроса и ответа"""
+    print(f"{event!r}\nrequest={event.request_text()}\nresponse={event.response_text()}\n")
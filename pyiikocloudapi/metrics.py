@@ -0,0 +1,140 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence
+
+from pyiikocloudapi.hooks import Hooks, HookEvent
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (как histogram в Prometheus)"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Пары (le, накопленное количество), последняя пара - +Inf"""
+        total = 0
+        out = []
+        for le, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            out.append((le, total))
+        return out
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": self.sum, "buckets": self.cumulative()}
+
+
+class EndpointMetrics:
+    """Метрики одного url"""
+    __slots__ = ("requests", "errors", "latency", "parse", "request_bytes", "response_bytes")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.requests = 0
+        self.errors: Dict[str, int] = {}
+        self.latency = Histogram(buckets)
+        self.parse = Histogram(buckets)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": dict(self.errors),
+            "latency": self.latency.to_dict(),
+            "parse": self.parse.to_dict(),
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+        }
+
+
+class Metrics:
+    """
+    Метрики запросов по url: количество запросов, ошибки по статусу, гистограммы времени сети и времени
+    разбора ответа (parse_obj), размеры запросов и ответов.
+    Собирается через хуки клиента, один объект можно подключить к нескольким клиентам.
+
+        metrics = Metrics()
+        api = IikoTransport(api_login, metrics=metrics)
+        ...
+        metrics.snapshot()["/api/1/nomenclature"]["parse"]
+        metrics.to_prometheus()
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.__buckets = tuple(sorted(buckets))
+        self.__endpoints: Dict[str, EndpointMetrics] = {}
+        self.__lock = threading.Lock()
+
+    def attach(self, hooks: Hooks):
+        """Подписаться на события клиента"""
+        hooks.on_response(self.observe)
+        hooks.on_error(self.observe)
+
+    def detach(self, hooks: Hooks):
+        hooks.remove(self.observe)
+
+    def observe(self, event: HookEvent):
+        with self.__lock:
+            endpoint = self.__endpoints.get(event.endpoint)
+            if endpoint is None:
+                endpoint = self.__endpoints[event.endpoint] = EndpointMetrics(self.__buckets)
+            endpoint.requests += 1
+            endpoint.request_bytes += event.request_size
+            endpoint.response_bytes += event.response_size
+            endpoint.latency.observe(event.elapsed)
+            if event.parse_elapsed:
+                endpoint.parse.observe(event.parse_elapsed)
+            if event.error is not None or (event.status is not None and event.status >= 400):
+                key = str(event.status) if event.status is not None else type(event.error).__name__
+                endpoint.errors[key] = endpoint.errors.get(key, 0) + 1
+
+    def reset(self):
+        with self.__lock:
+            self.__endpoints.clear()
+
+    def snapshot(self, endpoint: Optional[str] = None) -> dict:
+        """Текущие значения метрик по url (или по одному url)"""
+        with self.__lock:
+            if endpoint is not None:
+                item = self.__endpoints.get(endpoint)
+                return item.to_dict() if item is not None else {}
+            return {url: item.to_dict() for url, item in self.__endpoints.items()}
+
+    def to_prometheus(self, prefix: str = "iiko") -> str:
+        """Метрики в текстовом формате Prometheus"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# TYPE {prefix}_requests_total counter",
+            *(f'{prefix}_requests_total{{endpoint="{url}"}} {item["requests"]}' for url, item in snapshot.items()),
+            f"# TYPE {prefix}_errors_total counter",
+            *(f'{prefix}_errors_total{{endpoint="{url}",status="{status}"}} {count}'
+              for url, item in snapshot.items() for status, count in item["errors"].items()),
+            f"# TYPE {prefix}_request_bytes_total counter",
+            *(f'{prefix}_request_bytes_total{{endpoint="{url}"}} {item["request_bytes"]}'
+              for url, item in snapshot.items()),
+            f"# TYPE {prefix}_response_bytes_total counter",
+            *(f'{prefix}_response_bytes_total{{endpoint="{url}"}} {item["response_bytes"]}'
+              for url, item in snapshot.items()),
+        ]
+        for name, key in ((f"{prefix}_request_duration_seconds", "latency"),
+                          (f"{prefix}_parse_duration_seconds", "parse")):
+            lines.append(f"# TYPE {name} histogram")
+            for url, item in snapshot.items():
+                histogram = item[key]
+                for le, count in histogram["buckets"]:
+                    le = "+Inf" if le == float("inf") else repr(le)
+                    lines.append(f'{name}_bucket{{endpoint="{url}",le="{le}"}} {count}')
+                lines.append(f'{name}_sum{{endpoint="{url}"}} {histogram["sum"]}')
+                lines.append(f'{name}_count{{endpoint="{url}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
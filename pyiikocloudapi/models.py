@@ -44,7 +44,7 @@ class EmployeeItemModel(BaseModel):
     middle_name: Optional[str] = Field(alias='middleName')
     last_name: Optional[str] = Field(alias='lastName')
     display_name: str = Field(alias='displayName')
-    code: str
+    code: Optional[str]
     is_deleted: bool = Field(alias='isDeleted')
 
 
@@ -332,6 +332,14 @@ class ByDeliveryDateAndSourceKeyAndFilter(ByDeliveryDateAndStatusModel):
     pass
 
 
+class ByRevisionModel(ByDeliveryDateAndStatusModel):
+    pass
+
+
+class ByDeliveryDateAndPhoneModel(ByDeliveryDateAndStatusModel):
+    pass
+
+
 class RegionsItemModel(BaseModel):
     id: str
     name: str
@@ -628,7 +636,7 @@ class NPSPPriceModel(BaseModel):
 
 
 class NPSizePriceModel(BaseModel):
-    size_id: Optional[str]
+    size_id: Optional[str] = Field(alias="sizeId")
     price: NPSPPriceModel
 
 
@@ -0,0 +1,413 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from pyiikocloudapi.exception import PostException
+from pyiikocloudapi.models import BaseNomenclatureModel, CustomErrorModel, NomenclatureGroupModel, NPModifierModel, \
+    NPSPPriceModel, NProductCategoriesModel, NProductModel, NSizeModel
+from pyiikocloudapi.parsing import LazyModel, PARSE_FULL, parsing
+from pyiikocloudapi.structs import msgspec
+
+NOMENCLATURE_KINDS = ("groups", "product_categories", "products", "sizes")
+NOMENCLATURE_MODELS = {
+    "groups": NomenclatureGroupModel,
+    "product_categories": NProductCategoriesModel,
+    "products": NProductModel,
+    "sizes": NSizeModel,
+}
+
+
+def _item_id(item) -> str:
+    return item["id"] if isinstance(item, dict) else item.id
+
+
+def _item_json(item) -> str:
+    """JSON элемента с именами полей iiko (alias), чтобы его можно было разобрать моделью обратно"""
+    if isinstance(item, dict):
+        return json.dumps(item, ensure_ascii=False)
+    if isinstance(item, LazyModel):
+        return json.dumps(item.dict(), ensure_ascii=False)
+    if msgspec is not None and isinstance(item, msgspec.Struct):
+        return msgspec.json.encode(item).decode()
+    return item.json(by_alias=True, ensure_ascii=False)
+
+
+def _item_deleted(item) -> bool:
+    if isinstance(item, dict):
+        return bool(item.get("is_deleted", item.get("isDeleted")))
+    return bool(getattr(item, "is_deleted", False))
+
+
+class NomenclatureIndex:
+    """
+    Индексы номенклатуры для поиска за O(1): товары хранятся в массиве products, словари отдают позицию
+    товара в массиве, группы, категории и схемы модификаторов - массивы позиций.
+    Индекс неизменяемый, для новой ревизии строится новый (см. NomenclatureSync.index).
+
+        index = NomenclatureIndex(api.nomenclature(organization_id))
+        product = index.product(product_id)
+        price = index.price(product_id, size_id)
+    """
+
+    def __init__(self, nomenclature: BaseNomenclatureModel):
+        self.revision: int = nomenclature.revision
+        self.products: Tuple[NProductModel, ...] = tuple(nomenclature.products)
+        self.groups: Dict[str, NomenclatureGroupModel] = {group.id: group for group in nomenclature.groups}
+        self.sizes: Dict[str, NSizeModel] = {size.id: size for size in nomenclature.sizes}
+        self.categories: Dict[str, NProductCategoriesModel] = {category.id: category
+                                                               for category in nomenclature.product_categories}
+        self.__by_id: Dict[str, int] = {}
+        self.__by_code: Dict[str, int] = {}
+        self.__by_group: Dict[Optional[str], array] = {}
+        self.__by_category: Dict[Optional[str], array] = {}
+        self.__by_modifier_schema: Dict[Optional[str], array] = {}
+        self.__subgroups: Dict[Optional[str], List[str]] = {}
+        self.__prices: Dict[Tuple[str, Optional[str]], NPSPPriceModel] = {}
+        self.__modifiers: Dict[Tuple[str, str], NPModifierModel] = {}
+
+        for position, product in enumerate(self.products):
+            self.__by_id[product.id] = position
+            if product.code:
+                self.__by_code[product.code] = position
+            group_id = product.parent_group if product.parent_group is not None else product.group_id
+            self.__by_group.setdefault(group_id, array("l")).append(position)
+            self.__by_category.setdefault(product.product_category_id, array("l")).append(position)
+            if product.modifier_schema_id is not None:
+                self.__by_modifier_schema.setdefault(product.modifier_schema_id, array("l")).append(position)
+            for size_price in product.size_prices:
+                self.__prices[(product.id, size_price.size_id)] = size_price.price
+            for modifier in product.modifiers:
+                self.__modifiers[(product.id, modifier.id)] = modifier
+            for group_modifier in product.group_modifiers:
+                if group_modifier is None:
+                    continue
+                for modifier in group_modifier.child_modifiers:
+                    self.__modifiers[(product.id, modifier.id)] = modifier
+        for group in self.groups.values():
+            self.__subgroups.setdefault(group.parent_group, []).append(group.id)
+
+    def __len__(self):
+        return len(self.products)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self.__by_id
+
+    def _products(self, positions: Sequence[int]) -> List[NProductModel]:
+        products = self.products
+        return [products[position] for position in positions]
+
+    def position(self, product_id: str) -> Optional[int]:
+        """Позиция товара в массиве products"""
+        return self.__by_id.get(product_id)
+
+    def product(self, product_id: str) -> Optional[NProductModel]:
+        position = self.__by_id.get(product_id)
+        return None if position is None else self.products[position]
+
+    def product_by_code(self, code: str) -> Optional[NProductModel]:
+        position = self.__by_code.get(code)
+        return None if position is None else self.products[position]
+
+    def group(self, group_id: str) -> Optional[NomenclatureGroupModel]:
+        return self.groups.get(group_id)
+
+    def size(self, size_id: str) -> Optional[NSizeModel]:
+        return self.sizes.get(size_id)
+
+    def category(self, category_id: str) -> Optional[NProductCategoriesModel]:
+        return self.categories.get(category_id)
+
+    def products_in_group(self, group_id: Optional[str]) -> List[NProductModel]:
+        """Товары группы (parentGroup, если не задан - groupId), None - товары без группы"""
+        return self._products(self.__by_group.get(group_id, ()))
+
+    def subgroups(self, group_id: Optional[str]) -> List[NomenclatureGroupModel]:
+        """Дочерние группы, None - группы верхнего уровня"""
+        return [self.groups[child_id] for child_id in self.__subgroups.get(group_id, ())]
+
+    def products_in_category(self, category_id: Optional[str]) -> List[NProductModel]:
+        return self._products(self.__by_category.get(category_id, ()))
+
+    def products_by_modifier_schema(self, modifier_schema_id: str) -> List[NProductModel]:
+        return self._products(self.__by_modifier_schema.get(modifier_schema_id, ()))
+
+    def modifier(self, product_id: str, modifier_id: str) -> Optional[NPModifierModel]:
+        """Модификатор товара, в том числе дочерний модификатор групповых модификаторов"""
+        return self.__modifiers.get((product_id, modifier_id))
+
+    def size_price(self, product_id: str, size_id: Optional[str] = None) -> Optional[NPSPPriceModel]:
+        """Цена товара для размера (size_id=None - товар без шкалы размеров)"""
+        return self.__prices.get((product_id, size_id))
+
+    def price(self, product_id: str, size_id: Optional[str] = None) -> Optional[float]:
+        """Текущая цена товара для размера"""
+        price = self.__prices.get((product_id, size_id))
+        return None if price is None else price.current_price
+
+
+class NomenclatureStore(ABC):
+    """
+    Хранилище номенклатуры организаций для NomenclatureSync.
+    revision - последняя применённая ревизия организации (None - номенклатуры ещё нет),
+    apply - применить изменения: элементы заменяются по id, элементы с is_deleted удаляются,
+    full=True - полная номенклатура, прежнее содержимое организации удаляется,
+    snapshot - текущая номенклатура организации.
+    """
+
+    @abstractmethod
+    def revision(self, organization_id: str) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    def apply(self, organization_id: str, revision: int, changes: Dict[str, Iterable], full: bool = False):
+        pass
+
+    @abstractmethod
+    def snapshot(self, organization_id: str) -> Optional[BaseNomenclatureModel]:
+        pass
+
+
+class MemoryNomenclatureStore(NomenclatureStore):
+    """Хранилище в памяти процесса: элементы по видам и id"""
+
+    def __init__(self):
+        self.__revisions: Dict[str, int] = {}
+        self.__items: Dict[str, Dict[str, Dict[str, object]]] = {}
+        self.__lock = threading.Lock()
+
+    def revision(self, organization_id: str) -> Optional[int]:
+        return self.__revisions.get(organization_id)
+
+    def apply(self, organization_id: str, revision: int, changes: Dict[str, Iterable], full: bool = False):
+        with self.__lock:
+            items = self.__items.get(organization_id)
+            if full or items is None:
+                items = {kind: {} for kind in NOMENCLATURE_KINDS}
+            else:
+                # Копия при записи: snapshot, взятый раньше, не меняется
+                items = {kind: dict(items[kind]) for kind in NOMENCLATURE_KINDS}
+            for kind, values in changes.items():
+                by_id = items[kind]
+                for item in values:
+                    if _item_deleted(item):
+                        by_id.pop(_item_id(item), None)
+                    else:
+                        by_id[_item_id(item)] = item
+            self.__items[organization_id] = items
+            self.__revisions[organization_id] = revision
+
+    def snapshot(self, organization_id: str) -> Optional[BaseNomenclatureModel]:
+        items = self.__items.get(organization_id)
+        if items is None:
+            return None
+        return BaseNomenclatureModel.construct(correlation_id=None,
+                                               revision=self.__revisions[organization_id],
+                                               **{kind: list(items[kind].values()) for kind in NOMENCLATURE_KINDS})
+
+
+class NomenclatureSync:
+    """
+    Инкрементальная синхронизация номенклатуры: первый запрос загружает номенклатуру целиком, следующие
+    передают startRevision и получают только изменения, которые объединяются с хранилищем.
+
+        sync = NomenclatureSync(api)
+        sync.update(organization_id)
+        menu = sync.snapshot(organization_id)
+
+    Для AsyncIikoTransport используйте await sync.update_async(organization_id).
+    """
+
+    def __init__(self, api, store: Optional[NomenclatureStore] = None, stream: bool = False):
+        """
+        :param api: IikoTransport or AsyncIikoTransport
+        :param store: nomenclature store, MemoryNomenclatureStore by default
+        :param stream: load with nomenclature_stream (requires ijson) instead of one response model
+        """
+        self.api = api
+        self.store = store if store is not None else MemoryNomenclatureStore()
+        self.stream = stream
+        self.__locks: Dict[str, threading.Lock] = {}
+        self.__async_locks: Dict[str, asyncio.Lock] = {}
+        self.__indexes: Dict[str, NomenclatureIndex] = {}
+        self.__guard = threading.Lock()
+
+    def __lock(self, organization_id: str) -> threading.Lock:
+        with self.__guard:
+            return self.__locks.setdefault(organization_id, threading.Lock())
+
+    def revision(self, organization_id: str) -> Optional[int]:
+        return self.store.revision(organization_id)
+
+    def snapshot(self, organization_id: str) -> Optional[BaseNomenclatureModel]:
+        """Текущая номенклатура организации (None, если ещё не загружена)"""
+        return self.store.snapshot(organization_id)
+
+    def index(self, organization_id: str) -> Optional[NomenclatureIndex]:
+        """NomenclatureIndex текущей номенклатуры, перестраивается только при смене ревизии"""
+        revision = self.store.revision(organization_id)
+        if revision is None:
+            return None
+        index = self.__indexes.get(organization_id)
+        if index is None or index.revision != revision:
+            snapshot = self.store.snapshot(organization_id)
+            index = self.__indexes[organization_id] = NomenclatureIndex(snapshot)
+        return index
+
+    def _apply(self, organization_id: str, start_revision: Optional[int], revision: Optional[int],
+               changes: Dict[str, List]) -> bool:
+        if revision is None:
+            # Без revision в ответе сохраняется прежняя ревизия: следующий запрос повторит те же изменения
+            # (замена по id безопасна), а не запросит всю номенклатуру со startRevision=null
+            if start_revision is None:
+                raise PostException(self.__class__.__qualname__, self.update.__name__,
+                                    f"Номенклатура организации {organization_id} получена без revision")
+            revision = start_revision
+        if start_revision is not None and revision == start_revision and not any(changes.values()):
+            return False
+        self.store.apply(organization_id, revision, changes, full=start_revision is None)
+        return True
+
+    def update(self, organization_id: str, full: bool = False) -> Union[bool, CustomErrorModel]:
+        """
+        Запросить изменения с последней ревизии и применить их. Если в ответе нет revision, изменения
+        применяются, а ревизия остаётся прежней; полная номенклатура без revision - PostException
+        :param full: load the whole nomenclature ignoring the stored revision
+        :return: True - there were changes, False - the revision is current, CustomErrorModel - iiko error
+        """
+        with self.__lock(organization_id):
+            start_revision = None if full else self.store.revision(organization_id)
+            changes: Dict[str, List] = {kind: [] for kind in NOMENCLATURE_KINDS}
+            if self.stream:
+                revision = None
+                for kind, item in self.api.nomenclature_stream(organization_id, start_revision):
+                    if kind == "error":
+                        return item
+                    if kind == "revision":
+                        revision = item
+                    elif kind in changes:
+                        changes[kind].append(item)
+            else:
+                with parsing(PARSE_FULL):
+                    result = self.api.nomenclature(organization_id, start_revision)
+                if isinstance(result, CustomErrorModel):
+                    return result
+                revision = result.revision
+                changes = {kind: getattr(result, kind) for kind in NOMENCLATURE_KINDS}
+            return self._apply(organization_id, start_revision, revision, changes)
+
+    async def update_async(self, organization_id: str, full: bool = False) -> Union[bool, CustomErrorModel]:
+        """update() для AsyncIikoTransport"""
+        async with self.__async_locks.setdefault(organization_id, asyncio.Lock()):
+            return await self.__update_async(organization_id, full)
+
+    async def __update_async(self, organization_id: str, full: bool) -> Union[bool, CustomErrorModel]:
+        start_revision = None if full else self.store.revision(organization_id)
+        changes: Dict[str, List] = {kind: [] for kind in NOMENCLATURE_KINDS}
+        if self.stream:
+            revision = None
+            async for kind, item in self.api.nomenclature_stream(organization_id, start_revision):
+                if kind == "error":
+                    return item
+                if kind == "revision":
+                    revision = item
+                elif kind in changes:
+                    changes[kind].append(item)
+        else:
+            with parsing(PARSE_FULL):
+                result = await self.api.nomenclature(organization_id, start_revision)
+            if isinstance(result, CustomErrorModel):
+                return result
+            revision = result.revision
+            changes = {kind: getattr(result, kind) for kind in NOMENCLATURE_KINDS}
+        return self._apply(organization_id, start_revision, revision, changes)
+
+
+class SQLiteNomenclatureStore(NomenclatureStore):
+    """
+    Номенклатура в SQLite базе: переживает перезапуск, открывается без загрузки и разбора всей номенклатуры.
+    Элементы хранятся JSON строками по организации, виду и id, product/item читают и разбирают одну строку,
+    snapshot разбирает всю номенклатуру организации.
+
+        sync = NomenclatureSync(api, SQLiteNomenclatureStore("/var/lib/app/nomenclature.db"))
+        sync.update(organization_id)  # после перезапуска запрашиваются только изменения с сохранённой ревизии
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__local = threading.local()
+        connection = self._connection()
+        with connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS revisions "
+                               "(organization_id TEXT PRIMARY KEY, revision INTEGER NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS items "
+                               "(organization_id TEXT NOT NULL, kind TEXT NOT NULL, id TEXT NOT NULL, code TEXT, "
+                               "data TEXT NOT NULL, PRIMARY KEY (organization_id, kind, id))")
+            connection.execute("CREATE INDEX IF NOT EXISTS items_code ON items (organization_id, kind, code)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока (sqlite3 соединения нельзя использовать из разных потоков)"""
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = self.__local.connection = sqlite3.connect(self.path, timeout=30)
+        return connection
+
+    def revision(self, organization_id: str) -> Optional[int]:
+        row = self._connection().execute("SELECT revision FROM revisions WHERE organization_id = ?",
+                                         (organization_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def apply(self, organization_id: str, revision: int, changes: Dict[str, Iterable], full: bool = False):
+        connection = self._connection()
+        with connection:
+            if full:
+                connection.execute("DELETE FROM items WHERE organization_id = ?", (organization_id,))
+            for kind, values in changes.items():
+                deleted, changed = [], []
+                for item in values:
+                    if _item_deleted(item):
+                        deleted.append((organization_id, kind, _item_id(item)))
+                    else:
+                        code = item.get("code") if isinstance(item, dict) else getattr(item, "code", None)
+                        changed.append((organization_id, kind, _item_id(item), code, _item_json(item)))
+                connection.executemany("DELETE FROM items WHERE organization_id = ? AND kind = ? AND id = ?",
+                                       deleted)
+                connection.executemany("INSERT OR REPLACE INTO items (organization_id, kind, id, code, data) "
+                                       "VALUES (?, ?, ?, ?, ?)", changed)
+            connection.execute("INSERT OR REPLACE INTO revisions (organization_id, revision) VALUES (?, ?)",
+                               (organization_id, revision))
+
+    def item(self, organization_id: str, kind: str, item_id: str):
+        """Элемент номенклатуры вида kind ("groups", "product_categories", "products", "sizes") по id"""
+        row = self._connection().execute("SELECT data FROM items WHERE organization_id = ? AND kind = ? AND id = ?",
+                                         (organization_id, kind, item_id)).fetchone()
+        return None if row is None else NOMENCLATURE_MODELS[kind].parse_raw(row[0])
+
+    def product(self, organization_id: str, product_id: str) -> Optional[NProductModel]:
+        return self.item(organization_id, "products", product_id)
+
+    def product_by_code(self, organization_id: str, code: str) -> Optional[NProductModel]:
+        row = self._connection().execute("SELECT data FROM items WHERE organization_id = ? AND kind = 'products' "
+                                         "AND code = ?", (organization_id, code)).fetchone()
+        return None if row is None else NProductModel.parse_raw(row[0])
+
+    def snapshot(self, organization_id: str) -> Optional[BaseNomenclatureModel]:
+        revision = self.revision(organization_id)
+        if revision is None:
+            return None
+        items: Dict[str, list] = {kind: [] for kind in NOMENCLATURE_KINDS}
+        for kind, data in self._connection().execute("SELECT kind, data FROM items WHERE organization_id = ?",
+                                                     (organization_id,)):
+            items[kind].append(NOMENCLATURE_MODELS[kind].parse_raw(data))
+        return BaseNomenclatureModel.construct(correlation_id=None, revision=revision, **items)
+
+    def close(self):
+        """Закрыть соединение текущего потока"""
+        connection = getattr(self.__local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
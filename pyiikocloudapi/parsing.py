@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Type
+
+from pydantic import BaseModel, ValidationError
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
+from pydantic.utils import lenient_issubclass
+
+PARSE_FULL = "full"
+PARSE_LAZY = "lazy"
+PARSE_RAW = "raw"
+PARSE_BYTES = "bytes"
+PARSE_MODES = (PARSE_FULL, PARSE_LAZY, PARSE_RAW, PARSE_BYTES)
+
+_parse_mode: ContextVar[Optional[str]] = ContextVar("pyiikocloudapi_parse_mode", default=None)
+
+
+def check_parse_mode(mode: str) -> str:
+    if mode not in PARSE_MODES:
+        raise ValueError(f"Неизвестный режим разбора {mode!r}, допустимые: {', '.join(PARSE_MODES)}")
+    return mode
+
+
+@contextmanager
+def parsing(mode: str):
+    """
+    Режим разбора ответов для вызовов внутри блока (текущий поток или asyncio задача), имеет приоритет
+    над parse_mode клиента:
+
+        with api.parsing("raw"):
+            data = api.by_delivery_date_and_status(...)
+    """
+    token = _parse_mode.set(check_parse_mode(mode))
+    try:
+        yield
+    finally:
+        _parse_mode.reset(token)
+
+
+def current_parse_mode(default: str = PARSE_FULL) -> str:
+    return _parse_mode.get() or default
+
+
+class LazyModel:
+    """
+    Ответ без предварительной валидации: поле модели валидируется при первом обращении к нему и кэшируется,
+    вложенные модели (и списки моделей) тоже оборачиваются в LazyModel.
+    to_model() - полная валидация в исходную модель, dict() - исходные данные ответа.
+    """
+    __slots__ = ("_model", "_data", "_cache")
+
+    def __init__(self, model: Type[BaseModel], data: dict):
+        object.__setattr__(self, "_model", model)
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_cache", {})
+
+    def __getattr__(self, name: str):
+        field = self._model.__fields__.get(name)
+        if field is None:
+            # Собственные методы модели (например __list_id__) работают поверх ленивых полей
+            method = getattr(self._model, name, None)
+            if callable(method) and not hasattr(BaseModel, name):
+                return method.__get__(self)
+            raise AttributeError(f"{self._model.__name__!r} object has no attribute {name!r}")
+        cache = self._cache
+        if name in cache:
+            return cache[name]
+        if field.alias in self._data:
+            value = self._lazy_value(field, self._data[field.alias])
+        elif name in self._data:
+            value = self._lazy_value(field, self._data[name])
+        else:
+            value = field.get_default()
+        cache[name] = value
+        return value
+
+    def __setattr__(self, name, value):
+        self._cache[name] = value
+
+    def _lazy_value(self, field, raw):
+        if raw is None:
+            return None
+        if lenient_issubclass(field.type_, BaseModel):
+            if field.shape == SHAPE_SINGLETON and isinstance(raw, dict):
+                return LazyModel(field.type_, raw)
+            if field.shape == SHAPE_LIST and isinstance(raw, list):
+                return [LazyModel(field.type_, item) if isinstance(item, dict) else item for item in raw]
+        value, error = field.validate(raw, {}, loc=field.name, cls=self._model)
+        if error:
+            raise ValidationError([error], self._model)
+        return value
+
+    def to_model(self) -> BaseModel:
+        return self._model.parse_obj(self._data)
+
+    def dict(self) -> dict:
+        return self._data
+
+    def __repr__(self):
+        return f"LazyModel({self._model.__name__})"
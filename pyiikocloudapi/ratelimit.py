@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class TokenBucket:
+    """
+    Token bucket в памяти процесса, потокобезопасный.
+    reserve() сразу резервирует токены (баланс может уйти в минус) и возвращает время ожидания,
+    поэтому ожидание выполняется вне блокировки и подходит как для потоков, так и для asyncio.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        """
+        :param rate: tokens per second
+        :param burst: bucket size
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self, weight: float = 1.0) -> float:
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            self.__tokens -= weight
+            return 0.0 if self.__tokens >= 0 else -self.__tokens / self.rate
+
+
+class FileTokenBucket:
+    """
+    Token bucket в локальном файле под flock, общий для процессов одной машины (gunicorn/celery воркеры).
+    reserve() ждёт блокировку файла, поэтому асинхронный клиент вызывает его в пуле потоков (blocking = True).
+    """
+    blocking = True
+
+    def __init__(self, path: str, rate: float, burst: float):
+        if fcntl is None:
+            raise RuntimeError("FileTokenBucket требует fcntl (POSIX)")
+        self.path = path
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.__lock = threading.Lock()
+
+    def reserve(self, weight: float = 1.0) -> float:
+        with self.__lock, open(self.path, "a+b") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                raw = file.read()
+                now = time.time()
+                try:
+                    state = json.loads(raw)
+                    tokens = min(self.burst, state["tokens"] + max(0.0, now - state["updated"]) * self.rate)
+                except (ValueError, KeyError, TypeError):
+                    tokens = self.burst
+                tokens -= weight
+                file.seek(0)
+                file.truncate()
+                file.write(json.dumps({"tokens": tokens, "updated": now}).encode())
+                file.flush()
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Ограничитель запросов к iiko для одного apiLogin.
+
+        limiter = RateLimiter.for_login(api_login, rate=10, burst=20, weights={"/api/1/nomenclature": 5})
+        api = IikoTransport(api_login, rate_limiter=limiter)
+
+    Один объект можно передать нескольким клиентам и потокам, для нескольких процессов используйте
+    shared=True (состояние хранится в файле во временной директории) или свой path.
+    """
+    __registry: Dict[Tuple[str, Optional[str]], "RateLimiter"] = {}
+    __registry_lock = threading.Lock()
+
+    def __init__(self, rate: float, burst: Optional[float] = None, weights: Optional[Dict[str, float]] = None,
+                 default_weight: float = 1.0, bucket=None):
+        """
+        :param rate: requests (weight units) per second
+        :param burst: bucket size, by default equal to rate
+        :param weights: weight of endpoint by url, for example {"/api/1/nomenclature": 5}
+        :param default_weight: weight of other endpoints
+        :param bucket: bucket backend (TokenBucket, FileTokenBucket or object with reserve(weight) -> seconds)
+        """
+        burst = rate if burst is None else burst
+        self.bucket = bucket if bucket is not None else TokenBucket(rate, burst)
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+
+    @classmethod
+    def for_login(cls, api_login: str, rate: float, burst: Optional[float] = None,
+                  weights: Optional[Dict[str, float]] = None, shared: bool = False,
+                  path: Optional[str] = None) -> "RateLimiter":
+        """
+        Ограничитель для apiLogin, общий для всех клиентов процесса с этим логином.
+        Повторный вызов с другими rate, burst или weights - ValueError (ограничитель уже используется)
+        :param shared: share state between processes through a file
+        :param path: file of the shared state, by default in the temp directory
+        """
+        if shared and path is None:
+            name = hashlib.sha1(api_login.encode()).hexdigest()[:16]
+            path = os.path.join(tempfile.gettempdir(), f"pyiikocloudapi-{name}.bucket")
+        key = (api_login, path)
+        burst = rate if burst is None else burst
+        with cls.__registry_lock:
+            limiter = cls.__registry.get(key)
+            if limiter is None:
+                bucket = FileTokenBucket(path, rate, burst) if path is not None else None
+                limiter = cls.__registry[key] = cls(rate, burst, weights, bucket=bucket)
+            elif (limiter.bucket.rate, limiter.bucket.burst, limiter.weights) != \
+                    (float(rate), float(burst), dict(weights or {})):
+                raise ValueError(f"Ограничитель для {api_login!r} уже создан с rate={limiter.bucket.rate}, "
+                                 f"burst={limiter.bucket.burst}, weights={limiter.weights}")
+            return limiter
+
+    def weight(self, url: str) -> float:
+        return self.weights.get(url, self.default_weight)
+
+    def acquire(self, url: str = ""):
+        """Дождаться разрешения на запрос (блокирует поток)"""
+        delay = self.bucket.reserve(self.weight(url))
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, url: str = ""):
+        """Дождаться разрешения на запрос (не блокирует event loop)"""
+        if getattr(self.bucket, "blocking", False):
+            delay = await asyncio.get_running_loop().run_in_executor(None, self.bucket.reserve, self.weight(url))
+        else:
+            delay = self.bucket.reserve(self.weight(url))
+        if delay > 0:
+            await asyncio.sleep(delay)
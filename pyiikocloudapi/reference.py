@@ -0,0 +1,78 @@
+from typing import Dict, Hashable, List, Optional, Union
+
+from pyiikocloudapi.concurrency import CallResult
+from pyiikocloudapi.models import CustomErrorModel
+
+REFERENCE_PARTS = ("organizations", "cancel_causes", "order_types", "discounts", "payment_types", "removal_types",
+                   "tips_types", "terminal_groups", "couriers")
+
+
+def _by_id(items) -> Dict[str, object]:
+    return {item.id: item for item in items or ()}
+
+
+def _grouped(groups) -> Dict[str, list]:
+    """Списки вида [{organizationId, items}] -> {organization_id: items}"""
+    return {group.organization_id: list(group.items or ()) for group in groups or ()}
+
+
+class ReferenceSnapshot:
+    """
+    Справочные данные организаций, загруженные одним вызовом load_reference_snapshot.
+    responses - ответы по частям (REFERENCE_PARTS), errors - ошибки частей (исключение или CustomErrorModel),
+    индексы по id построены по частям, которые загрузились.
+    """
+
+    def __init__(self, organization_ids: List[str], results: Dict[Hashable, CallResult]):
+        self.organization_ids = list(organization_ids)
+        self.responses: Dict[str, object] = {part: result.value for part, result in results.items() if result.ok}
+        self.errors: Dict[str, Union[Exception, CustomErrorModel]] = {part: result.error
+                                                                      for part, result in results.items()
+                                                                      if not result.ok}
+        self.elapsed: Dict[str, float] = {part: result.elapsed for part, result in results.items()}
+
+        organizations = self.responses.get("organizations")
+        self.organizations = _by_id(organizations.organizations if organizations else None)
+
+        cancel_causes = self.responses.get("cancel_causes")
+        self.cancel_causes = _by_id(cancel_causes.cancel_causes if cancel_causes else None)
+
+        order_types = self.responses.get("order_types")
+        self.order_types_by_organization = _grouped(order_types.order_types if order_types else None)
+        self.order_types = _by_id(item for items in self.order_types_by_organization.values() for item in items)
+
+        discounts = self.responses.get("discounts")
+        self.discounts_by_organization = _grouped(discounts.discounts if discounts else None)
+        self.discounts = _by_id(item for items in self.discounts_by_organization.values() for item in items)
+
+        payment_types = self.responses.get("payment_types")
+        self.payment_types = _by_id(payment_types.payment_types if payment_types else None)
+        self.payment_types_by_code = {item.code: item for item in self.payment_types.values() if item.code}
+
+        removal_types = self.responses.get("removal_types")
+        self.removal_types = _by_id(removal_types.removal_types if removal_types else None)
+
+        tips_types = self.responses.get("tips_types")
+        self.tips_types = _by_id(tips_types.tips_types if tips_types else None)
+
+        terminal_groups = self.responses.get("terminal_groups")
+        self.terminal_groups_by_organization = _grouped(terminal_groups.terminal_groups if terminal_groups else None)
+        self.terminal_groups = _by_id(item for items in self.terminal_groups_by_organization.values()
+                                      for item in items)
+
+        couriers = self.responses.get("couriers")
+        self.couriers_by_organization = _grouped(couriers.employees if couriers else None)
+        self.couriers = _by_id(item for items in self.couriers_by_organization.values() for item in items)
+        self.couriers_by_code = {item.code: item for item in self.couriers.values() if item.code}
+
+    @property
+    def ok(self) -> bool:
+        """Все части загружены без ошибок"""
+        return not self.errors
+
+    def response(self, part: str) -> Optional[object]:
+        return self.responses.get(part)
+
+    def __repr__(self):
+        return f"ReferenceSnapshot(organizations={len(self.organization_ids)}, loaded={sorted(self.responses)}, " \
+               f"errors={sorted(self.errors)})"
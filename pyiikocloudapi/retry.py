@@ -0,0 +1,84 @@
+import random
+import threading
+from typing import Iterable, Optional
+
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class RetryBudget:
+    """
+    Бюджет повторов: каждый запрос пополняет бюджет на ratio, каждый повтор тратит единицу.
+    При массовых ошибках доля повторов не превышает ratio от потока запросов (плюс запас min_retries),
+    поэтому повторы не умножают нагрузку на iiko.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        self.__ratio = ratio
+        self.__max_tokens = float(min_retries) + 100 * ratio
+        self.__tokens = float(min_retries)
+        self.__lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        return self.__tokens
+
+    def deposit(self):
+        with self.__lock:
+            self.__tokens = min(self.__max_tokens, self.__tokens + self.__ratio)
+
+    def withdraw(self) -> bool:
+        with self.__lock:
+            if self.__tokens < 1:
+                return False
+            self.__tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Политика повторов для _post_request: экспоненциальная задержка с полным джиттером
+    (случайная задержка от 0 до min(max_delay, base_delay * 2 ** attempt)), ограничение количества попыток,
+    общего времени и бюджет повторов.
+    Повторяются только идемпотентные запросы: методы чтения и создание заказа с заданным клиентом id.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 10.0,
+                 max_elapsed: float = 30.0, statuses: Iterable[int] = RETRY_STATUSES,
+                 budget: Optional[RetryBudget] = None):
+        """
+
+        :param max_attempts: maximum number of attempts including the first one
+        :param base_delay: delay before the first retry, seconds
+        :param max_delay: maximum delay between attempts, seconds
+        :param max_elapsed: no retry is started if it would end after this time since the first attempt, seconds
+        :param statuses: HTTP statuses to retry
+        :param budget: retry budget, can be shared between clients
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.statuses = frozenset(statuses)
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def backoff(self, attempt: int) -> float:
+        """Задержка перед повтором номер attempt (с нуля)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        return status_code in self.statuses
+
+    def next_delay(self, attempt: int, elapsed: float) -> Optional[float]:
+        """
+        Задержка перед следующей попыткой или None, если повторять нельзя
+        :param attempt: number of the failed attempt (from zero)
+        :param elapsed: seconds since the first attempt
+        """
+        if attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if elapsed + delay > self.max_elapsed:
+            return None
+        if not self.budget.withdraw():
+            return None
+        return delay
@@ -0,0 +1,81 @@
+from typing import Iterable, List, Optional
+
+SHARDED_URLS = frozenset({
+    "/api/1/cancel_causes",
+    "/api/1/deliveries/order_types",
+    "/api/1/discounts",
+    "/api/1/payment_types",
+    "/api/1/removal_types",
+    "/api/1/terminal_groups",
+    "/api/1/regions",
+    "/api/1/cities",
+    "/api/1/employees/couriers",
+    "/api/1/deliveries/by_delivery_date_and_status",
+    "/api/1/deliveries/by_delivery_date_and_phone",
+})
+# Не разбиваются: by_revision - maxRevision частей, запрошенных в разное время, нельзя объединить в одну ревизию
+# ленты изменений; by_delivery_date_and_source_key_and_filter - rowsCount и сортировка применяются к каждой части;
+# terminal_groups/is_alive - terminalGroupIds по запросу не разделить по организациям, каждая часть получила бы все
+
+MIN_KEYS = ("maxRevision", "revision")
+
+
+class Sharding:
+    """
+    Разбиение больших списков organizationIds на части, которые запрашиваются параллельно, ответы
+    объединяются в один: списки склеиваются (элементы с id без повторов), maxRevision - минимальная из частей
+    (части запрашиваются в разное время, следующий запрос с этой ревизии не пропустит изменений ни одной части).
+
+        api = IikoTransport(api_login, sharding=Sharding(chunk_size=50, max_workers=4))
+    """
+
+    def __init__(self, chunk_size: int = 50, max_workers: int = 4, urls: Optional[Iterable[str]] = None):
+        """
+        :param chunk_size: maximum number of organizations in one request
+        :param max_workers: maximum number of simultaneous requests of one call
+        :param urls: urls to shard, SHARDED_URLS by default
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size должен быть больше 0")
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.urls = frozenset(urls) if urls is not None else SHARDED_URLS
+
+    def applies(self, url: str, data: Optional[dict]) -> bool:
+        if url not in self.urls or not data:
+            return False
+        organization_ids = data.get("organizationIds")
+        return organization_ids is not None and len(organization_ids) > self.chunk_size
+
+    def split(self, data: dict) -> List[dict]:
+        """Тело запроса для каждой части organizationIds"""
+        organization_ids = list(data["organizationIds"])
+        return [dict(data, organizationIds=organization_ids[start:start + self.chunk_size])
+                for start in range(0, len(organization_ids), self.chunk_size)]
+
+    @staticmethod
+    def merge(responses: List[dict]) -> dict:
+        """Объединить ответы частей (dict) в порядке частей"""
+        merged: dict = {}
+        seen = {}
+        for response in responses:
+            for key, value in response.items():
+                if key not in merged:
+                    if isinstance(value, list):
+                        merged[key] = []
+                        seen[key] = set()
+                    else:
+                        merged[key] = value
+                        continue
+                if isinstance(value, list) and isinstance(merged[key], list):
+                    ids = seen[key]
+                    for item in value:
+                        item_id = item.get("id") if isinstance(item, dict) else None
+                        if item_id is not None:
+                            if item_id in ids:
+                                continue
+                            ids.add(item_id)
+                        merged[key].append(item)
+                elif key in MIN_KEYS and value is not None:
+                    merged[key] = value if merged[key] is None else min(merged[key], value)
+        return merged
@@ -0,0 +1,86 @@
+from typing import Dict, List, Optional, Tuple, Type
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover
+    ijson = None
+
+from pydantic import BaseModel
+
+from pyiikocloudapi.models import NomenclatureGroupModel, NProductCategoriesModel, NProductModel, NSizeModel
+
+
+class StreamParser:
+    """
+    Инкрементальный разбор ответа по событиям ijson: элементы массивов из items собираются по одному и сразу
+    отдаются моделями, значения из scalars отдаются в конце разбора.
+    Ответ целиком в памяти не хранится, в каждый момент собирается только один элемент.
+    """
+    items: Dict[str, Tuple[str, Type[BaseModel]]] = {}
+    scalars: Dict[str, str] = {}
+
+    def __init__(self):
+        if ijson is None:
+            raise ImportError("Для потокового разбора необходим ijson: pip install pyiikocloudapi[stream]")
+        self.__builder = None
+        self.__prefix: Optional[str] = None
+        self.__values: Dict[str, object] = {}
+
+    def event(self, prefix: str, event: str, value) -> Optional[Tuple[str, BaseModel]]:
+        """Обработать событие ijson.parse, вернуть (kind, model), когда элемент собран"""
+        builder = self.__builder
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == self.__prefix and event in ("end_map", "end_array"):
+                self.__builder = None
+                kind, model = self.items[prefix]
+                return kind, model.parse_obj(builder.value)
+            return None
+        if event == "start_map" and prefix in self.items:
+            self.__builder = ijson.ObjectBuilder()
+            self.__builder.event(event, value)
+            self.__prefix = prefix
+        elif prefix in self.scalars and event in ("number", "string", "boolean", "null"):
+            self.__values[self.scalars[prefix]] = value
+        return None
+
+    def finish(self) -> List[Tuple[str, object]]:
+        """Значения scalars, собранные за время разбора"""
+        return [(kind, self.__values.get(kind)) for kind in self.scalars.values()]
+
+
+class NomenclatureStreamParser(StreamParser):
+    """
+    Потоковый разбор /api/1/nomenclature: ("groups", NomenclatureGroupModel), ("product_categories",
+    NProductCategoriesModel), ("products", NProductModel), ("sizes", NSizeModel), в конце ("correlation_id", str)
+    и ("revision", int)
+    """
+    items = {
+        "groups.item": ("groups", NomenclatureGroupModel),
+        "productCategories.item": ("product_categories", NProductCategoriesModel),
+        "products.item": ("products", NProductModel),
+        "sizes.item": ("sizes", NSizeModel),
+    }
+    scalars = {
+        "correlationId": "correlation_id",
+        "revision": "revision",
+    }
+
+
+class AsyncByteStream:
+    """Файлоподобная обёртка над асинхронным итератором байт (httpx aiter_bytes) для ijson.parse_async"""
+
+    def __init__(self, iterator):
+        self.__iterator = iterator
+        self.__buffer = b""
+
+    async def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.__buffer) < size:
+            try:
+                self.__buffer += await self.__iterator.__anext__()
+            except StopAsyncIteration:
+                break
+        if size < 0:
+            size = len(self.__buffer)
+        chunk, self.__buffer = self.__buffer[:size], self.__buffer[size:]
+        return chunk
@@ -0,0 +1,105 @@
+import copy
+import inspect
+import threading
+from typing import Any, Dict, List, Type, Union, get_args, get_origin
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+from pydantic import BaseModel
+from pydantic.utils import lenient_issubclass
+
+MODEL_BACKENDS = ("pydantic", "msgspec")
+
+_structs: Dict[type, type] = {}
+_decoders: Dict[type, "msgspec.json.Decoder"] = {}
+_lock = threading.RLock()
+_building = set()
+
+
+def check_model_backend(backend: str) -> str:
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Неизвестный backend моделей {backend!r}, допустимые: {', '.join(MODEL_BACKENDS)}")
+    if backend == "msgspec" and msgspec is None:
+        raise ImportError("Для model_backend='msgspec' необходим msgspec: pip install pyiikocloudapi[msgspec]")
+    return backend
+
+
+def _is_object(tp) -> bool:
+    return tp is dict or get_origin(tp) is dict or (isinstance(tp, type) and issubclass(tp, msgspec.Struct))
+
+
+def _convert_type(tp):
+    """Аннотация поля pydantic модели -> тип для msgspec"""
+    if lenient_issubclass(tp, BaseModel):
+        return struct_for(tp)
+    origin = get_origin(tp)
+    if origin in (list, List):
+        args = get_args(tp)
+        return List[_convert_type(args[0])] if args else list
+    if origin is Union:
+        args = tuple(_convert_type(arg) for arg in get_args(tp))
+        # msgspec не различает несколько объектных типов в Union без тега: такие поля остаются dict
+        if sum(1 for arg in args if _is_object(arg)) > 1:
+            return Any
+        return Union[args]
+    if tp in (str, int, float, bool, dict, list, Any, type(None)) or get_origin(tp) is not None:
+        return tp
+    return Any
+
+
+def _methods(model: Type[BaseModel]) -> dict:
+    """Собственные методы модели (__str__, __list_id__, get_by_... ), они переносятся в Struct"""
+    namespace = {}
+    for klass in reversed(model.__mro__):
+        if klass is BaseModel or not lenient_issubclass(klass, BaseModel):
+            continue
+        for name, value in vars(klass).items():
+            if inspect.isfunction(value) and name not in vars(BaseModel):
+                namespace[name] = value
+    return namespace
+
+
+def struct_for(model: Type[BaseModel]) -> Type["msgspec.Struct"]:
+    """
+    msgspec.Struct, построенный по pydantic модели: те же имена полей, alias - имя в JSON, те же значения по умолчанию
+    и методы модели. Структуры создаются один раз и кэшируются, поэтому всегда соответствуют models.py.
+    """
+    struct = _structs.get(model)
+    if struct is not None:
+        return struct
+    with _lock:
+        struct = _structs.get(model)
+        if struct is not None:
+            return struct
+        if model in _building:
+            # Рекурсивная модель: вложенный уровень остаётся dict
+            return Any
+        _building.add(model)
+        try:
+            fields = []
+            for field in model.__fields__.values():
+                tp = _convert_type(field.annotation)
+                if field.required:
+                    spec = msgspec.field(name=field.alias)
+                elif isinstance(field.default, (list, dict)):
+                    spec = msgspec.field(name=field.alias, default_factory=lambda d=field.default: copy.deepcopy(d))
+                else:
+                    spec = msgspec.field(name=field.alias, default=field.default)
+                fields.append((field.name, tp, spec))
+            struct = msgspec.defstruct(model.__name__, fields, kw_only=True, namespace=_methods(model),
+                                       module=__name__)
+        finally:
+            _building.discard(model)
+        _structs[model] = struct
+        return struct
+
+
+def decode(model: Type[BaseModel], content: bytes):
+    """Разобрать JSON ответа сразу в Struct модели (без промежуточного dict)"""
+    decoder = _decoders.get(model)
+    if decoder is None:
+        decoder = _decoders[model] = msgspec.json.Decoder(struct_for(model), strict=False)
+    return decoder.decode(content)
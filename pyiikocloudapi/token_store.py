@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+def token_key(api_login: str, base_url: str) -> str:
+    """Ключ маркера в хранилище (apiLogin не хранится в открытом виде)"""
+    return hashlib.sha256(f"{base_url}|{api_login}".encode()).hexdigest()
+
+
+class TokenStore(ABC):
+    """
+    Хранилище маркеров доступа, общее для клиентов (и процессов), работающих с одним apiLogin.
+    get/set читают и записывают маркер и время его получения, lock - блокировка на время запроса нового маркера,
+    чтобы маркер запрашивал только один клиент.
+    """
+
+    @abstractmethod
+    def get(self, api_login: str, base_url: str) -> Optional[Tuple[str, datetime]]:
+        pass
+
+    @abstractmethod
+    def set(self, api_login: str, base_url: str, token: str, time_token: datetime):
+        pass
+
+    @abstractmethod
+    def lock(self, api_login: str, base_url: str):
+        pass
+
+
+class MemoryTokenStore(TokenStore):
+    """Хранилище в памяти процесса (общее для клиентов в разных потоках)"""
+
+    def __init__(self):
+        self.__tokens: Dict[str, Tuple[str, datetime]] = {}
+        self.__locks: Dict[str, threading.Lock] = {}
+        self.__guard = threading.Lock()
+
+    def get(self, api_login: str, base_url: str) -> Optional[Tuple[str, datetime]]:
+        return self.__tokens.get(token_key(api_login, base_url))
+
+    def set(self, api_login: str, base_url: str, token: str, time_token: datetime):
+        self.__tokens[token_key(api_login, base_url)] = (token, time_token)
+
+    @contextmanager
+    def lock(self, api_login: str, base_url: str):
+        key = token_key(api_login, base_url)
+        with self.__guard:
+            lock = self.__locks.setdefault(key, threading.Lock())
+        with lock:
+            yield
+
+
+class _FileLockedStore(TokenStore):
+    """Межпроцессная блокировка через flock на файле path + ".lock" """
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError(f"{self.__class__.__name__} требует fcntl (POSIX)")
+        self.path = path
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def lock(self, api_login: str, base_url: str):
+        with self._thread_lock, open(f"{self.path}.lock", "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class FileTokenStore(_FileLockedStore):
+    """Хранилище в JSON файле, общее для процессов одной машины"""
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "rb") as file:
+                return json.loads(file.read() or b"{}")
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, api_login: str, base_url: str) -> Optional[Tuple[str, datetime]]:
+        item = self._read().get(token_key(api_login, base_url))
+        if not item:
+            return None
+        return item["token"], datetime.fromtimestamp(item["time_token"])
+
+    def set(self, api_login: str, base_url: str, token: str, time_token: datetime):
+        data = self._read()
+        data[token_key(api_login, base_url)] = {"token": token, "time_token": time_token.timestamp()}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file)
+        os.replace(tmp, self.path)
+
+
+class SQLiteTokenStore(_FileLockedStore):
+    """Хранилище в SQLite базе, общее для процессов одной машины"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        # Как у FileTokenStore: база с маркерами доступна только владельцу (журнал SQLite наследует эти права)
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS tokens "
+                                   "(key TEXT PRIMARY KEY, token TEXT NOT NULL, time_token REAL NOT NULL)")
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, api_login: str, base_url: str) -> Optional[Tuple[str, datetime]]:
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT token, time_token FROM tokens WHERE key = ?",
+                                     (token_key(api_login, base_url),)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return row[0], datetime.fromtimestamp(row[1])
+
+    def set(self, api_login: str, base_url: str, token: str, time_token: datetime):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO tokens (key, token, time_token) VALUES (?, ?, ?)",
+                                   (token_key(api_login, base_url), token, time_token.timestamp()))
+        finally:
+            connection.close()
@@ -0,0 +1,138 @@
+import socket
+from typing import Dict, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter с дополнительными опциями сокета (TCP keepalive)"""
+
+    def __init__(self, socket_options: Optional[List[tuple]] = None, **kwargs):
+        self.socket_options = socket_options
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.socket_options:
+            kwargs["socket_options"] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class TransportConfig:
+    """
+    Настройки транспорта: размер пула соединений, таймауты (в том числе для отдельных url), keep-alive и TCP keepalive.
+
+        transport = TransportConfig(pool_maxsize=64, read_timeout=30, endpoint_timeouts={"/api/1/nomenclature": 180})
+        api = IikoTransport(api_login, transport=transport)
+        api.pool_stats()
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 32, pool_block: bool = False,
+                 connect_timeout: float = 10.0, read_timeout: float = 120.0,
+                 endpoint_timeouts: Optional[Dict[str, Timeout]] = None, keep_alive: bool = True,
+                 keepalive_expiry: float = 60.0, tcp_keepalive: bool = False, tcp_keepalive_idle: int = 60,
+                 tcp_keepalive_interval: int = 15, tcp_keepalive_count: int = 4, max_retries: int = 0):
+        """
+        :param pool_connections: number of hosts to keep pools for
+        :param pool_maxsize: maximum number of connections kept in a pool of one host
+        :param pool_block: wait for a free connection instead of opening an extra one
+        :param connect_timeout: connect timeout, seconds
+        :param read_timeout: read timeout, seconds (iiko waits for the terminal up to 2 minutes)
+        :param endpoint_timeouts: timeouts by url: read timeout or (connect, read)
+        :param keep_alive: reuse connections
+        :param keepalive_expiry: idle connection lifetime for the async client, seconds
+        :param tcp_keepalive: enable TCP keepalive on sockets
+        :param max_retries: retries of connection errors on the adapter level (retry_policy works above it)
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.endpoint_timeouts = dict(endpoint_timeouts or {})
+        self.keep_alive = keep_alive
+        self.keepalive_expiry = keepalive_expiry
+        self.tcp_keepalive = tcp_keepalive
+        self.tcp_keepalive_idle = tcp_keepalive_idle
+        self.tcp_keepalive_interval = tcp_keepalive_interval
+        self.tcp_keepalive_count = tcp_keepalive_count
+        self.max_retries = max_retries
+
+    def timeout(self, url: str = "") -> Tuple[float, float]:
+        """(connect, read) таймаут для url"""
+        timeout = self.endpoint_timeouts.get(url)
+        if timeout is None:
+            return self.connect_timeout, self.read_timeout
+        if isinstance(timeout, tuple):
+            return timeout
+        return self.connect_timeout, timeout
+
+    def socket_options(self) -> List[tuple]:
+        if not self.tcp_keepalive:
+            return []
+        options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1), (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        for name, value in (("TCP_KEEPIDLE", self.tcp_keepalive_idle),
+                            ("TCP_KEEPINTVL", self.tcp_keepalive_interval),
+                            ("TCP_KEEPCNT", self.tcp_keepalive_count)):
+            if hasattr(socket, name):
+                options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+        return options
+
+    def mount(self, session: requests.Session) -> requests.Session:
+        """Подключить адаптер с настройками пула к сессии"""
+        adapter = KeepAliveHTTPAdapter(socket_options=self.socket_options(),
+                                       pool_connections=self.pool_connections,
+                                       pool_maxsize=self.pool_maxsize,
+                                       pool_block=self.pool_block,
+                                       max_retries=self.max_retries)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def httpx_limits(self):
+        import httpx
+        return httpx.Limits(max_connections=None if not self.pool_block else self.pool_maxsize,
+                            max_keepalive_connections=self.pool_maxsize if self.keep_alive else 0,
+                            keepalive_expiry=self.keepalive_expiry)
+
+    def httpx_timeout(self, url: str = ""):
+        import httpx
+        connect, read = self.timeout(url)
+        return httpx.Timeout(read, connect=connect)
+
+    def httpx_transport(self):
+        import httpx
+        return httpx.AsyncHTTPTransport(limits=self.httpx_limits(), socket_options=self.socket_options() or None)
+
+
+def pool_stats(session: requests.Session) -> Dict[str, dict]:
+    """
+    Состояние пулов соединений requests сессии по хостам:
+    in_use - соединения, выданные запросам, idle - открытые соединения в пуле,
+    connections - открыто соединений всего, requests - выполнено запросов,
+    reuse_ratio - доля запросов, выполненных на уже открытом соединении
+    """
+    stats = {}
+    for adapter in set(session.adapters.values()):
+        manager = getattr(adapter, "poolmanager", None)
+        if manager is None:
+            continue
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            queue = list(pool.pool.queue)
+            requests_count = pool.num_requests
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "in_use": max(0, pool.pool.maxsize - len(queue)),
+                "idle": sum(1 for connection in queue if connection is not None),
+                "maxsize": pool.pool.maxsize,
+                "connections": pool.num_connections,
+                "requests": requests_count,
+                "reuse_ratio": (requests_count - pool.num_connections) / requests_count if requests_count else 0.0,
+            }
+    return stats
@@ -20,6 +20,13 @@ setup(
         'Tracker': 'https://github.com/kebrick/pyiikocloupapi/issues',
     },
     install_requires=['requests', 'pydantic'],
+    extras_require={
+        'async': ['httpx'],
+        'orjson': ['orjson'],
+        'msgspec': ['msgspec'],
+        'stream': ['ijson'],
+        'test': ['pytest', 'httpx', 'ijson'],
+    },
 
     python_requires='>=3.8',
     zip_safe=False
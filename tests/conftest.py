@@ -0,0 +1,129 @@
+import io
+import json
+from urllib.parse import urlparse
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+from pyiikocloudapi import AsyncIikoTransport, IikoTransport
+
+BASE_URL = "https://iiko.test"
+
+
+class Unreachable(Exception):
+    """Маршрут FakeIiko бросает его, чтобы имитировать ошибку соединения"""
+
+
+class FakeIiko:
+    """
+    Поддельный iiko Cloud API: routes[path] - функция body -> (status_code, ответ), ответ - dict или bytes.
+    Маркер доступа выдаётся всегда, calls - список (path, body) всех запросов
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.tokens = 0
+        self.routes = {"/api/1/access_token": self._access_token}
+
+    def _access_token(self, body):
+        self.tokens += 1
+        return 200, {"correlationId": "c-token", "token": f"token{self.tokens}"}
+
+    def route(self, path, status_code=200, payload=None, func=None):
+        self.routes[path] = func if func is not None else (lambda body: (status_code, payload))
+
+    def sequence(self, path, *responses):
+        """Ответы по очереди: (status_code, ответ) или исключение, последний повторяется"""
+        responses = list(responses)
+
+        def route(body):
+            response = responses.pop(0) if len(responses) > 1 else responses[0]
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        self.routes[path] = route
+
+    def handle(self, path, content):
+        body = json.loads(content) if content else {}
+        self.calls.append((path, body))
+        route = self.routes.get(path)
+        if route is None:
+            return 404, {"correlationId": "c-404", "errorDescription": "unknown path", "error": "NotFound"}
+        return route(body)
+
+    def requests_to(self, path):
+        return [body for call_path, body in self.calls if call_path == path]
+
+    @staticmethod
+    def encode(payload):
+        return payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+
+
+class FakeAdapter(BaseAdapter):
+    """Транспорт requests, который отвечает из FakeIiko без сети"""
+
+    def __init__(self, iiko: FakeIiko):
+        super().__init__()
+        self.iiko = iiko
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        try:
+            status_code, payload = self.iiko.handle(urlparse(request.url).path, request.body)
+        except Unreachable as err:
+            raise requests.exceptions.ConnectionError(str(err), request=request)
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+        response.raw = io.BytesIO(self.iiko.encode(payload))
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def iiko():
+    return FakeIiko()
+
+
+@pytest.fixture
+def make_api(iiko):
+    def make(**kwargs):
+        session = requests.Session()
+        session.mount(BASE_URL, FakeAdapter(iiko))
+        kwargs.setdefault("retry_policy", False)
+        return IikoTransport("login", session=session, base_url=BASE_URL, **kwargs)
+
+    return make
+
+
+@pytest.fixture
+def make_async_api(iiko):
+    if httpx is None:
+        pytest.skip("httpx is not installed")
+
+    def handler(request):
+        try:
+            status_code, payload = iiko.handle(request.url.path, request.content)
+        except Unreachable as err:
+            raise httpx.ConnectError(str(err), request=request)
+        return httpx.Response(status_code, content=iiko.encode(payload),
+                              headers={"Content-Type": "application/json"})
+
+    def make(**kwargs):
+        kwargs.setdefault("retry_policy", False)
+        return AsyncIikoTransport("login", client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                                  base_url=BASE_URL, **kwargs)
+
+    return make
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from pyiikocloudapi.concurrency import aiter_parallel, iter_parallel, run_parallel
+
+
+class Payload:
+    """Ответ вызова, считает живые экземпляры"""
+    alive = 0
+    lock = threading.Lock()
+
+    def __init__(self, index):
+        self.index = index
+        with Payload.lock:
+            Payload.alive += 1
+
+    def __del__(self):
+        with Payload.lock:
+            Payload.alive -= 1
+
+
+@pytest.fixture(autouse=True)
+def reset_payload():
+    Payload.alive = 0
+    yield
+
+
+def make_calls(count, started, delay=0.0):
+    def call(index):
+        started.append(index)
+        time.sleep(delay)
+        return Payload(index)
+
+    return ((index, lambda index=index: call(index)) for index in range(count))
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_iter_parallel_holds_at_most_max_workers_results(ordered):
+    started = []
+    held = []
+    keys = []
+    for result in iter_parallel(make_calls(10, started, 0.01), max_workers=3, ordered=ordered):
+        # медленный потребитель: пулу хватает времени выполнить всё, что ему отдали
+        time.sleep(0.03)
+        held.append(Payload.alive)
+        keys.append(result.key)
+        assert len(started) <= len(keys) + 3
+        del result
+    assert sorted(keys) == list(range(10))
+    if ordered:
+        assert keys == list(range(10))
+    assert max(held) <= 3
+    assert Payload.alive == 0
+
+
+def test_iter_parallel_errors_and_timeout():
+    def fail():
+        raise ValueError("boom")
+
+    results = run_parallel([("ok", lambda: 1), ("fail", fail), ("slow", lambda: time.sleep(0.5))],
+                           max_workers=3, timeout=0.1)
+    assert results["ok"].value == 1 and results["ok"].ok
+    assert isinstance(results["fail"].error, ValueError)
+    assert isinstance(results["slow"].error, TimeoutError)
+
+
+def test_iter_parallel_stops_pulling_calls_on_close():
+    started = []
+    results = iter_parallel(make_calls(100, started), max_workers=2)
+    next(results)
+    results.close()
+    assert len(started) <= 3
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_aiter_parallel_holds_at_most_max_workers_results(ordered):
+    started = []
+
+    def calls():
+        for index in range(10):
+            async def call(index=index):
+                started.append(index)
+                await asyncio.sleep(0.001 * (10 - index))
+                return Payload(index)
+
+            yield index, call
+
+    async def main():
+        held = []
+        keys = []
+        async for result in aiter_parallel(calls(), max_workers=3, ordered=ordered):
+            await asyncio.sleep(0.02)
+            held.append(Payload.alive)
+            keys.append(result.key)
+            assert len(started) <= len(keys) + 3
+            del result
+        return held, keys
+
+    held, keys = asyncio.run(main())
+    assert sorted(keys) == list(range(10))
+    if ordered:
+        assert keys == list(range(10))
+    assert max(held) <= 3
+    assert Payload.alive == 0
+
+
+def test_delivery_windows_request_windows_lazily(iiko, make_api):
+    def by_date(body):
+        day = int(body["deliveryDateFrom"][8:10])
+        order = {"id": f"o{day}", "organizationId": "org1", "timestamp": 1, "creationStatus": "Success",
+                 "order": None}
+        return 200, {"correlationId": "c", "maxRevision": 1,
+                     "ordersByOrganizations": [{"organizationId": "org1", "orders": [order]}]}
+
+    iiko.route("/api/1/deliveries/by_delivery_date_and_status", func=by_date)
+    api = make_api()
+    orders = api.by_delivery_date_and_status_windows(["org1"], datetime(2026, 10, 1), datetime(2026, 10, 11),
+                                                     max_workers=2)
+    order, replaces_previous = next(orders)
+    assert not replaces_previous
+    assert len(iiko.requests_to("/api/1/deliveries/by_delivery_date_and_status")) <= 3
+    ids = [order.id] + [order.id for order, _ in orders]
+    assert sorted(ids) == sorted(f"o{day}" for day in range(1, 11))
@@ -0,0 +1,95 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from pyiikocloudapi.deliveries import COURIER_ASSIGNED, DeliveryChangeFeed, DeliveryOrderStore, MemoryRevisionStore, \
+    ORDER_CHANGED, ORDER_CREATED, STATUS_CHANGED, diff_order, normalize_phone
+from pyiikocloudapi.models import OrderRetrieveModel
+
+
+def order_data(i, status="OnWay", timestamp=1, courier="courier1", phone="+79990000000"):
+    return {"id": f"o{i}", "externalNumber": f"ext{i}", "organizationId": "org1", "timestamp": timestamp,
+            "creationStatus": "Success",
+            "order": {"phone": phone, "status": status, "completeBefore": f"2026-10-18 1{i % 10}:00:00.000",
+                      "whenCreated": "2026-10-18 10:00:00.000", "sum": 100.0, "number": i,
+                      "guestsInfo": {"count": 1, "splitBetweenPersons": False}, "items": [],
+                      "terminalGroupId": "tg1",
+                      "courierInfo": {"courier": {"id": courier, "name": "C"}, "isCourierSelectedManually": True}
+                      if courier else None}}
+
+
+def order(*args, **kwargs) -> OrderRetrieveModel:
+    return OrderRetrieveModel.parse_obj(order_data(*args, **kwargs))
+
+
+def by_revision_response(max_revision, orders):
+    return {"correlationId": "c", "maxRevision": max_revision,
+            "ordersByOrganizations": [{"organizationId": "org1", "orders": orders}]}
+
+
+def test_change_feed_requests_from_saved_revision(iiko, make_api):
+    iiko.sequence("/api/1/deliveries/by_revision", (200, by_revision_response(5, [order_data(1)])),
+                  (200, by_revision_response(7, [order_data(1, "Delivered", 2)])))
+    store = MemoryRevisionStore()
+    feed = DeliveryChangeFeed(make_api(), ["org1"], store)
+    assert [o.id for o in feed.poll()] == ["o1"]
+    assert feed.poll(commit=False)[0].order.status == "Delivered"
+    assert feed.revision == 5 and feed.last_revision == 7
+    feed.commit(feed.last_revision)
+    assert [body["startRevision"] for body in iiko.requests_to("/api/1/deliveries/by_revision")] == [0, 5]
+    assert DeliveryChangeFeed(make_api(), ["org1"], store).revision == 7
+
+
+def test_diff_order():
+    assert [event.kind for event in diff_order(None, order(1))] == [ORDER_CREATED, COURIER_ASSIGNED]
+    assert [event.kind for event in diff_order(order(1), order(1, "Delivered", 2, courier="courier2"))] == \
+        [ORDER_CHANGED, STATUS_CHANGED, COURIER_ASSIGNED]
+
+
+def test_order_store_indexes():
+    store = DeliveryOrderStore()
+    store.update_many([order(1), order(2, courier="courier2", phone="8 (999) 111-22-33"), order(3, "Delivered")])
+    assert [o.id for o in store.by_courier("courier1", status="OnWay")] == ["o1"]
+    assert [o.id for o in store.by_phone("+7 999 111 22 33")] == ["o2"]
+    assert [o.id for o in store.complete_before_between("2026-10-18 11:00:00.000", "2026-10-18 12:30:00.000")] == \
+        ["o1", "o2"]
+    assert not store.update(order(1, "Delivered", timestamp=0))
+    assert store.update(order(1, "Delivered", timestamp=2))
+    assert store.statuses() == {"OnWay": 1, "Delivered": 2}
+    assert store.by_courier("courier1", status="OnWay") == []
+
+
+def test_order_store_evicts_finished_orders():
+    store = DeliveryOrderStore(final_ttl=0.05)
+    store.update_many([order(1), order(2)])
+    store.update(order(1, "Closed", timestamp=2))
+    store.update(order(2, "Cancelled", timestamp=2))
+    store.update(order(2, "OnWay", timestamp=3))
+    assert len(store) == 2
+    time.sleep(0.1)
+    assert store.evict() == 1
+    assert [o.id for o in store] == ["o2"] and store.by_courier("courier1") == [store.get("o2")]
+
+    immediate = DeliveryOrderStore(final_ttl=0)
+    immediate.update(order(1, "Closed"))
+    assert len(immediate) == 0 and immediate.statuses() == {}
+
+
+def test_normalize_phone():
+    assert normalize_phone("8 (999) 000-00-00") == "+79990000000"
+    assert normalize_phone("+44 20 7946 0000") == "+442079460000"
+    with pytest.raises(ValueError):
+        normalize_phone("call me")
+
+
+def test_windows_skip_duplicates_on_boundaries(iiko, make_api):
+    def by_date(body):
+        day = int(body["deliveryDateFrom"][8:10])
+        return 200, by_revision_response(1, [order_data(100 + day), order_data(1, timestamp=day)])
+
+    iiko.route("/api/1/deliveries/by_delivery_date_and_status", func=by_date)
+    out = list(make_api().by_delivery_date_and_status_windows(["org1"], datetime(2026, 10, 1),
+                                                               datetime(2026, 10, 4), max_workers=1))
+    assert [(o.id, replaces_previous) for o, replaces_previous in out] == [
+        ("o101", False), ("o1", False), ("o102", False), ("o1", True), ("o103", False), ("o1", True)]
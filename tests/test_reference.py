@@ -0,0 +1,35 @@
+import asyncio
+
+
+def couriers(body):
+    items = [{"id": "c1", "displayName": "A", "code": "7", "isDeleted": False},
+             {"id": "c2", "displayName": "B", "code": None, "isDeleted": False},
+             {"id": "c3", "displayName": "C", "code": None, "isDeleted": False}]
+    return 200, {"correlationId": "c", "employees": [{"organizationId": org, "items": items}
+                                                     for org in body["organizationIds"]]}
+
+
+def cancel_causes(body):
+    return 200, {"correlationId": "c", "cancelCauses": [{"id": "cc1", "name": "x", "isDeleted": False}]}
+
+
+def test_reference_snapshot(iiko, make_api):
+    iiko.route("/api/1/employees/couriers", func=couriers)
+    iiko.route("/api/1/cancel_causes", func=cancel_causes)
+    snapshot = make_api().load_reference_snapshot(["org1"])
+    assert sorted(snapshot.couriers) == ["c1", "c2", "c3"]
+    assert list(snapshot.couriers_by_code) == ["7"]
+    assert snapshot.couriers_by_code["7"].id == "c1"
+    assert list(snapshot.cancel_causes) == ["cc1"]
+    # остальные части не настроены в FakeIiko и отвечают ошибкой
+    assert not snapshot.ok and "couriers" not in snapshot.errors and "discounts" in snapshot.errors
+
+
+def test_reference_snapshot_async(iiko, make_async_api):
+    iiko.route("/api/1/employees/couriers", func=couriers)
+
+    async def main():
+        async with make_async_api() as api:
+            return await api.load_reference_snapshot(["org1"])
+
+    assert list(asyncio.run(main()).couriers_by_code) == ["7"]
@@ -0,0 +1,67 @@
+import asyncio
+
+from pyiikocloudapi.sharding import Sharding
+
+ORGANIZATIONS = [f"org{i}" for i in range(5)]
+
+
+def terminal_groups(body):
+    return 200, {"correlationId": "c", "terminalGroups": [
+        {"organizationId": org, "items": [{"id": f"tg-{org}", "name": "T", "organizationId": org}]}
+        for org in body["organizationIds"]]}
+
+
+def by_date(body):
+    orders = [{"id": "shared", "organizationId": "org0", "timestamp": 1, "creationStatus": "Success", "order": None}]
+    return 200, {"correlationId": "c", "maxRevision": 10 + len(body["organizationIds"]),
+                 "ordersByOrganizations": [{"organizationId": org, "orders": orders}
+                                           for org in body["organizationIds"]]}
+
+
+def test_split_and_merge():
+    sharding = Sharding(chunk_size=2)
+    assert [part["organizationIds"] for part in sharding.split({"organizationIds": ORGANIZATIONS, "x": 1})] == \
+        [["org0", "org1"], ["org2", "org3"], ["org4"]]
+    merged = sharding.merge([{"maxRevision": 5, "items": [{"id": "a"}, {"id": "b"}]},
+                             {"maxRevision": 3, "items": [{"id": "b"}, {"id": "c"}]}])
+    assert merged == {"maxRevision": 3, "items": [{"id": "a"}, {"id": "b"}, {"id": "c"}]}
+
+
+def test_sharded_request_is_merged(iiko, make_api):
+    iiko.route("/api/1/terminal_groups", func=terminal_groups)
+    api = make_api(sharding=Sharding(chunk_size=2))
+    responses = []
+    api.hooks.on_response(responses.append)
+    out = api.terminal_groups(ORGANIZATIONS)
+    assert [group.organization_id for group in out.terminal_groups] == ORGANIZATIONS
+    assert sorted(body["organizationIds"] for body in iiko.requests_to("/api/1/terminal_groups")) == \
+        [["org0", "org1"], ["org2", "org3"], ["org4"]]
+    assert len(responses) == 3
+
+
+def test_sharded_max_revision_is_minimum(iiko, make_api, make_async_api):
+    iiko.route("/api/1/deliveries/by_delivery_date_and_status", func=by_date)
+    args = (ORGANIZATIONS, "2026-10-18 00:00:00.000", "2026-10-19 00:00:00.000")
+    out = make_api(sharding=Sharding(chunk_size=2)).by_delivery_date_and_status(*args)
+    assert out.max_revision == 11
+
+    async def main():
+        async with make_async_api(sharding=Sharding(chunk_size=2)) as api:
+            return await api.by_delivery_date_and_status(*args)
+
+    assert asyncio.run(main()).max_revision == 11
+
+
+def test_is_alive_is_not_sharded(iiko, make_api):
+    iiko.route("/api/1/terminal_groups/is_alive", payload={"correlationId": "c", "isAliveStatus": []})
+    terminal_group_ids = [f"tg-{org}" for org in ORGANIZATIONS]
+    make_api(sharding=Sharding(chunk_size=2)).is_alive(ORGANIZATIONS, terminal_group_ids)
+    assert iiko.requests_to("/api/1/terminal_groups/is_alive") == [
+        {"organizationIds": ORGANIZATIONS, "terminalGroupIds": terminal_group_ids}]
+
+
+def test_by_revision_is_not_sharded(iiko, make_api):
+    iiko.route("/api/1/deliveries/by_revision", payload={"correlationId": "c", "maxRevision": 3,
+                                                          "ordersByOrganizations": []})
+    make_api(sharding=Sharding(chunk_size=2)).by_revision(ORGANIZATIONS, 1)
+    assert len(iiko.requests_to("/api/1/deliveries/by_revision")) == 1
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import stat
+import threading
+from datetime import datetime
+
+import pytest
+
+from pyiikocloudapi.token_store import FileTokenStore, MemoryTokenStore, SQLiteTokenStore
+
+from conftest import BASE_URL
+
+CANCEL_CAUSES = {"correlationId": "c", "cancelCauses": []}
+
+
+class CountingLock:
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.store.thread_lock.acquire()
+        self.store.entered += 1
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.store.exited += 1
+        self.store.thread_lock.release()
+
+
+class CountingTokenStore(MemoryTokenStore):
+    """Блокировка - обычный объект с __enter__/__exit__ (не генератор), считает захваты и освобождения"""
+
+    def __init__(self):
+        super().__init__()
+        self.thread_lock = threading.Lock()
+        self.entered = 0
+        self.exited = 0
+
+    def lock(self, api_login, base_url):
+        return CountingLock(self)
+
+
+def lock_is_free(store, timeout=1.0) -> bool:
+    acquired = threading.Event()
+
+    def take():
+        with store.lock("login", BASE_URL):
+            acquired.set()
+
+    threading.Thread(target=take, daemon=True).start()
+    return acquired.wait(timeout)
+
+
+def test_token_store_is_shared(iiko, make_api):
+    iiko.route("/api/1/cancel_causes", payload=CANCEL_CAUSES)
+    store = MemoryTokenStore()
+    make_api(token_store=store, lazy=True).cancel_causes(["org1"])
+    make_api(token_store=store, lazy=True).cancel_causes(["org1"])
+    assert iiko.tokens == 1
+    assert lock_is_free(store)
+
+
+def test_async_token_store_lock_released_on_cancel(iiko, make_async_api):
+    iiko.route("/api/1/cancel_causes", payload=CANCEL_CAUSES)
+    store = CountingTokenStore()
+
+    async def main():
+        async with make_async_api(token_store=store) as api:
+            held = store.lock("login", BASE_URL)
+            held.__enter__()
+            task = asyncio.ensure_future(api.cancel_causes(["org1"]))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # поток executor захватывает блокировку уже после отмены задачи
+            held.__exit__(None, None, None)
+            await asyncio.sleep(0.1)
+            assert lock_is_free(store)
+            assert store.entered == store.exited
+
+            await api.cancel_causes(["org1"])
+            assert iiko.tokens == 1
+            assert store.get("login", BASE_URL)[0] == api.token
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("store_class", [FileTokenStore, SQLiteTokenStore])
+def test_file_stores_are_private(tmp_path, store_class):
+    path = str(tmp_path / "tokens")
+    store = store_class(path)
+    store.set("login", BASE_URL, "token", datetime.now())
+    assert store.get("login", BASE_URL)[0] == "token"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
@@ -0,0 +1,244 @@
+import asyncio
+
+import pytest
+
+from pyiikocloudapi.cache import ResponseCache
+from pyiikocloudapi.exception import PostException, TokenException, TransportException
+from pyiikocloudapi.models import BaseResponseModel, CustomErrorModel, OrderCloseRequestModel
+from pyiikocloudapi.parsing import LazyModel, parsing
+from pyiikocloudapi.ratelimit import RateLimiter
+from pyiikocloudapi.retry import RetryPolicy
+
+from conftest import Unreachable
+
+CANCEL_CAUSES = {"correlationId": "c", "cancelCauses": [{"id": "cc1", "name": "x", "isDeleted": False}]}
+UNAVAILABLE = (503, {"correlationId": "c-503", "errorDescription": "unavailable", "error": "X"})
+PROXY_ERROR = b"<html><body>502 Bad Gateway</body></html>"
+
+
+def organizations(*ids):
+    return {"correlationId": "c-org", "organizations": [{"id": i, "name": i, "responseType": "Simple"} for i in ids]}
+
+
+def test_non_json_response_raises_value_error(iiko, make_api):
+    iiko.route("/api/1/cancel_causes", 502, PROXY_ERROR)
+    api = make_api()
+    errors = []
+    api.hooks.on_error(errors.append)
+    with pytest.raises(ValueError):
+        api.cancel_causes(["org1"])
+    assert [event.status for event in errors] == [502]
+
+
+def test_non_json_response_raises_value_error_async(iiko, make_async_api):
+    iiko.route("/api/1/cancel_causes", 502, PROXY_ERROR)
+
+    async def main():
+        async with make_async_api() as api:
+            errors = []
+            api.hooks.on_error(errors.append)
+            with pytest.raises(ValueError):
+                await api.cancel_causes(["org1"])
+            return errors
+
+    assert [event.status for event in asyncio.run(main())] == [502]
+
+
+def test_sync_and_async_return_same_models(iiko, make_api, make_async_api):
+    iiko.route("/api/1/organizations", payload=organizations("org1", "org2"))
+
+    async def main():
+        async with make_async_api() as api:
+            return await api.organizations()
+
+    assert make_api().organizations() == asyncio.run(main())
+
+
+def test_stream_non_json_error_raises_value_error(iiko, make_api):
+    pytest.importorskip("ijson")
+    iiko.route("/api/1/nomenclature", 502, PROXY_ERROR)
+    api = make_api()
+    errors = []
+    api.hooks.on_error(errors.append)
+    with pytest.raises(ValueError):
+        list(api.nomenclature_stream("org1"))
+    assert [event.status for event in errors] == [502]
+
+
+def test_stream_non_json_error_raises_value_error_async(iiko, make_async_api):
+    pytest.importorskip("ijson")
+    iiko.route("/api/1/nomenclature", 502, PROXY_ERROR)
+
+    async def main():
+        async with make_async_api() as api:
+            errors = []
+            api.hooks.on_error(errors.append)
+            with pytest.raises(ValueError):
+                async for _ in api.nomenclature_stream("org1"):
+                    pass
+            return errors
+
+    assert [event.status for event in asyncio.run(main())] == [502]
+
+
+def test_stream_iiko_error(iiko, make_api):
+    pytest.importorskip("ijson")
+    iiko.route("/api/1/nomenclature", 400, {"correlationId": "c", "errorDescription": "bad", "error": "X"})
+    [(kind, error)] = list(make_api().nomenclature_stream("org1"))
+    assert kind == "error"
+    assert error.error_description == "bad" and error.status_code == 400
+
+
+def test_stream_items(iiko, make_api):
+    pytest.importorskip("ijson")
+    iiko.route("/api/1/nomenclature", payload={"correlationId": "c", "groups": [], "productCategories": [
+        {"id": "cat1", "name": "Cat", "isDeleted": False}], "products": [], "sizes": [], "revision": 7})
+    items = list(make_api().nomenclature_stream("org1"))
+    assert [kind for kind, _ in items] == ["product_categories", "correlation_id", "revision"]
+    assert items[0][1].id == "cat1" and items[-1][1] == 7
+
+
+def no_wait_retries(**kwargs):
+    return RetryPolicy(base_delay=0, **kwargs)
+
+
+def test_retry_transient_status(iiko, make_api):
+    iiko.sequence("/api/1/cancel_causes", UNAVAILABLE, UNAVAILABLE, (200, CANCEL_CAUSES))
+    out = make_api(retry_policy=no_wait_retries()).cancel_causes(["org1"])
+    assert out.cancel_causes[0].id == "cc1"
+    assert len(iiko.requests_to("/api/1/cancel_causes")) == 3
+
+
+def test_retry_gives_up_after_max_attempts(iiko, make_api):
+    iiko.sequence("/api/1/cancel_causes", UNAVAILABLE)
+    out = make_api(retry_policy=no_wait_retries(max_attempts=2)).cancel_causes(["org1"])
+    assert isinstance(out, CustomErrorModel) and out.status_code == 503
+    assert len(iiko.requests_to("/api/1/cancel_causes")) == 2
+
+
+def test_non_idempotent_request_is_not_retried(iiko, make_api):
+    iiko.sequence("/api/1/order/close", UNAVAILABLE, (200, {"correlationId": "c"}))
+    out = make_api(retry_policy=no_wait_retries()).close_order(
+        OrderCloseRequestModel(organizationId="org1", orderId="o1"))
+    assert isinstance(out, CustomErrorModel)
+    assert len(iiko.requests_to("/api/1/order/close")) == 1
+
+
+def test_retry_transient_status_async(iiko, make_async_api):
+    iiko.sequence("/api/1/cancel_causes", UNAVAILABLE, (200, CANCEL_CAUSES))
+
+    async def main():
+        async with make_async_api(retry_policy=no_wait_retries()) as api:
+            return await api.cancel_causes(["org1"])
+
+    assert asyncio.run(main()).cancel_causes[0].id == "cc1"
+    assert len(iiko.requests_to("/api/1/cancel_causes")) == 2
+
+
+def test_unauthorized_refreshes_token_once(iiko, make_api):
+    unauthorized = (401, {"correlationId": "c", "errorDescription": "token expired", "error": "X"})
+    iiko.sequence("/api/1/cancel_causes", unauthorized, (200, CANCEL_CAUSES))
+    api = make_api()
+    assert api.token == "token1"
+    assert api.cancel_causes(["org1"]).cancel_causes[0].id == "cc1"
+    assert api.token == "token2"
+
+
+def test_connection_error_is_retried_then_raised(iiko, make_api):
+    iiko.sequence("/api/1/cancel_causes", Unreachable("refused"), (200, CANCEL_CAUSES))
+    assert make_api(retry_policy=no_wait_retries()).cancel_causes(["org1"]).cancel_causes[0].id == "cc1"
+
+    iiko.sequence("/api/1/cancel_causes", Unreachable("refused"))
+    with pytest.raises(TransportException) as info:
+        make_api().cancel_causes(["org1"])
+    # TransportException заменяет ошибки, которые методы бросали раньше
+    assert isinstance(info.value, TokenException) and isinstance(info.value, PostException)
+
+
+def test_connection_error_async(iiko, make_async_api):
+    iiko.sequence("/api/1/cancel_causes", Unreachable("refused"))
+
+    async def main():
+        async with make_async_api() as api:
+            await api.cancel_causes(["org1"])
+
+    with pytest.raises(TransportException):
+        asyncio.run(main())
+
+
+def test_cache_dictionaries(iiko, make_api):
+    iiko.route("/api/1/cancel_causes", payload=CANCEL_CAUSES)
+    cache = ResponseCache()
+    api = make_api(cache=cache)
+    first = api.cancel_causes(["org1", "org2"])
+    assert api.cancel_causes(["org2", "org1"]) is first
+    with api.parsing("raw"):
+        assert api.cancel_causes(["org1", "org2"]) == CANCEL_CAUSES
+    assert len(iiko.requests_to("/api/1/cancel_causes")) == 2
+    assert cache.stats.hits == 1
+
+    cache.invalidate("/api/1/cancel_causes")
+    api.cancel_causes(["org1", "org2"])
+    assert len(iiko.requests_to("/api/1/cancel_causes")) == 3
+
+
+def test_cache_skips_errors(iiko, make_api):
+    iiko.sequence("/api/1/cancel_causes", (400, {"correlationId": "c", "errorDescription": "bad", "error": "X"}),
+                  (200, CANCEL_CAUSES))
+    api = make_api(cache=True)
+    assert isinstance(api.cancel_causes(["org1"]), CustomErrorModel)
+    assert api.cancel_causes(["org1"]).cancel_causes[0].id == "cc1"
+
+
+def test_parse_modes(iiko, make_api):
+    iiko.route("/api/1/cancel_causes", payload=CANCEL_CAUSES)
+    api = make_api()
+    with parsing("raw"):
+        assert api.cancel_causes(["org1"]) == CANCEL_CAUSES
+    with api.parsing("bytes"):
+        assert api.cancel_causes(["org1"]) == iiko.encode(CANCEL_CAUSES)
+    with api.parsing("lazy"):
+        lazy = api.cancel_causes(["org1"])
+        assert isinstance(lazy, LazyModel) and lazy.cancel_causes[0].id == "cc1"
+
+
+def test_msgspec_backend(iiko, make_api):
+    pytest.importorskip("msgspec")
+    iiko.route("/api/1/cancel_causes", payload=CANCEL_CAUSES)
+    iiko.route("/api/1/discounts", 400, {"correlationId": "c", "errorDescription": "bad", "error": "X"})
+    api = make_api(model_backend="msgspec")
+    out = api.cancel_causes(["org1"])
+    assert not isinstance(out, BaseResponseModel) and out.cancel_causes[0].id == "cc1"
+    assert isinstance(api.discounts(["org1"]), CustomErrorModel)
+
+
+def test_hooks_and_metrics(iiko, make_api):
+    iiko.route("/api/1/cancel_causes", payload=CANCEL_CAUSES)
+    iiko.route("/api/1/discounts", 400, {"correlationId": "c", "errorDescription": "bad", "error": "X"})
+    api = make_api(metrics=True)
+    requests_sent, responses = [], []
+    api.hooks.on_request(requests_sent.append)
+    api.hooks.on_response(responses.append)
+    api.cancel_causes(["org1"])
+    api.discounts(["org1"])
+    assert [event.endpoint for event in requests_sent] == ["/api/1/cancel_causes", "/api/1/discounts"]
+    assert [event.correlation_id for event in responses] == ["c"]
+    assert api.metrics.snapshot("/api/1/cancel_causes")["requests"] == 1
+    assert api.metrics.snapshot("/api/1/discounts")["errors"] == {"400": 1}
+
+
+class CountingBucket:
+    def __init__(self):
+        self.weights = []
+
+    def reserve(self, weight=1.0):
+        self.weights.append(weight)
+        return 0.0
+
+
+def test_rate_limiter_weights(iiko, make_api):
+    iiko.route("/api/1/cancel_causes", payload=CANCEL_CAUSES)
+    bucket = CountingBucket()
+    api = make_api(rate_limiter=RateLimiter(10, weights={"/api/1/cancel_causes": 3}, bucket=bucket))
+    api.cancel_causes(["org1"])
+    assert bucket.weights == [3]